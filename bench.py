@@ -0,0 +1,756 @@
+"""
+Offline benchmarks. Nothing here touches the network.
+
+  python bench.py corpus --posts 100000 --accounts 20000 --out .cache/bench-corpus.jsonl.gz
+  python bench.py pipeline --corpus .cache/bench-corpus.jsonl.gz [--profile]
+  python bench.py dates --corpus .cache/bench-corpus.jsonl.gz [--limit 2000]
+  python bench.py keywords --corpus .cache/bench-corpus.jsonl.gz [--limit 20000]
+  python bench.py parse --corpus .cache/bench-corpus.jsonl.gz [--limit 2000]
+  python bench.py analyze --corpus .cache/bench-corpus.jsonl.gz [--limit 4000] [--workers 1,2,4,8]
+  python bench.py startup [--repeat 5]
+  python bench.py summarize --corpus .cache/bench-corpus.jsonl.gz [--limit 64] [--batch 8]   (needs transformers)
+  python bench.py digest [--items 100000]
+  python bench.py render [--items 1000,50000]
+  python bench.py ics [--events 100000]
+  python bench.py notion [--items 200] [--rate 20]   (local Notion API stand-in)
+  python bench.py smtp [--recipients 200] [--items 50]   (needs aiosmtpd; local stand-in server)
+  python bench.py backends --corpus .cache/bench-corpus.jsonl.gz [--limit 32] [--backends fp32,int8,onnx]
+
+Replays honour MAX_POSTS_PER_ACCOUNT, so spread big corpora over enough accounts.
+Corpora are the gzip'd JSONL that POST_SOURCE=record writes (see src/sources.py), so a
+recorded live run can be benchmarked the same way as a synthetic one.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+CAPTION_TEMPLATES = [
+    "Join us for our {event} on {date} at {time} in {venue}! Register at the link in bio 🎉 #uoft #utm",
+    "Reminder: {event} applications close {date}. Apply now: https://example.com/apply — questions? email {email}",
+    "Our {event} is back! 📣 {date}, {time}, {venue}. Tickets are ${price}. Limited spots left, RSVP today.",
+    "Congrats to everyone who came out last week. Stay tuned for more updates! #community",
+    "FREE {event} this {weekday} at {time} — {venue}. Snacks provided 🍕 Sign up via link in bio.",
+    "Office hours update: we are closed {date}. Regular hours resume the following Monday.",
+    "Meet the new executive team! Swipe to learn more about who's running things this year. 💙",
+    "The {event} deadline is {date} at {time}. Don't miss out — registration closes soon. Contact {email}.",
+]
+EVENTS = ["workshop", "info session", "career fair", "case competition", "orientation", "boat cruise",
+          "tryouts", "seminar", "webinar", "town hall", "mixer", "open house", "auditions"]
+VENUES = ["Room DV2080", "Student Centre", "Deerfield Hall", "the gym", "IB Atrium", "Instructional Centre lobby"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+def _synthetic_caption(rng: random.Random, now: datetime) -> str:
+    day = now + timedelta(days=rng.randint(-2, 20))
+    return rng.choice(CAPTION_TEMPLATES).format(
+        event=rng.choice(EVENTS),
+        date=day.strftime(rng.choice(["%B %d", "%b %d", "%A, %B %d"])),
+        weekday=rng.choice(WEEKDAYS),
+        time=f"{rng.randint(1, 11)}{rng.choice(['', ':30'])}{rng.choice(['am', 'pm'])}",
+        venue=rng.choice(VENUES),
+        email=f"club{rng.randint(1, 99)}@utoronto.ca",
+        price=rng.choice([5, 10, 15, 25]),
+    )
+
+def cmd_corpus(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    per_account = max(1, args.posts // args.accounts)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    n = 0
+    with gzip.open(args.out, "wt", encoding="utf-8") as f:
+        for a in range(args.accounts):
+            for i in range(per_account):
+                taken = now - timedelta(hours=rng.randint(0, 24 * 4))
+                f.write(json.dumps({
+                    "account": f"club{a:05d}",
+                    "shortcode": f"S{a:05d}x{i:04d}",
+                    "date_utc": taken.isoformat(),
+                    "caption": _synthetic_caption(rng, now),
+                    "is_pinned": False,
+                }, ensure_ascii=False) + "\n")
+                n += 1
+    print(f"[BENCH] Wrote {n} posts for {args.accounts} accounts to {args.out}")
+
+def cmd_pipeline(args):
+    import main
+    from src.sources import ReplaySource
+
+    started = time.perf_counter()
+    source = ReplaySource(args.corpus)
+    load_s = time.perf_counter() - started
+    if args.profile:
+        import cProfile, pstats
+        prof = cProfile.Profile()
+        prof.enable()
+    started = time.perf_counter()
+    main.run(source=source, deliver=False)
+    run_s = time.perf_counter() - started
+    if args.profile:
+        prof.disable()
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+    print(f"[BENCH] corpus load {load_s:.2f}s | pipeline {run_s:.2f}s")
+
+def _load_captions(path: str, limit: int | None = None):
+    items = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                d = json.loads(line)
+                items.append({"account": d["account"], "shortcode": d["shortcode"], "caption": d.get("caption", "")})
+                if limit and len(items) >= limit:
+                    break
+    return items
+
+def cmd_dates(args):
+    from src import utils
+    from src.analyze import analyze_item, _clean_caption, _sentence_spans
+
+    items = _load_captions(args.corpus, args.limit)
+    # The pre-memo analyzer searched each of the first 8 sentences, then the whole caption again
+    before = sum(min(len(_sentence_spans(_clean_caption(it["caption"]))), 8) + bool(_clean_caption(it["caption"]))
+                 for it in items)
+    for label in ("cold memo", "warm memo"):
+        utils.DATEPARSER_STATS["calls"] = 0
+        started = time.perf_counter()
+        for it in items:
+            analyze_item(it)
+        secs = time.perf_counter() - started
+        calls = utils.DATEPARSER_STATS["calls"]
+        print(f"[BENCH] {label}: {calls / len(items):.2f} dateparser calls/item, {len(items) / secs:.1f} items/s")
+    print(f"[BENCH] before (per-sentence search): {before / len(items):.2f} dateparser calls/item")
+
+def cmd_parse(args):
+    """Per-item latency and peak allocation of analyze_item with a warm date memo (parsing/regex cost only)."""
+    import tracemalloc
+    from src.analyze import analyze_item
+
+    items = _load_captions(args.corpus, args.limit)
+    for it in items:
+        analyze_item(it)  # warm the date memo so dateparser drops out
+    started = time.perf_counter()
+    for it in items:
+        analyze_item(it)
+    per_item_us = (time.perf_counter() - started) / len(items) * 1e6
+
+    tracemalloc.start()
+    peaks = 0
+    for it in items:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        analyze_item(it)
+        peaks += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    print(f"[BENCH] analyze_item (warm memo): {per_item_us:.0f} us/item, {peaks / len(items) / 1024:.1f} KiB peak allocation/item")
+
+def _legacy_importance(low: str) -> str:
+    from src.keywords import CRITICAL, TIMEY
+    if any(k in low for k in CRITICAL):
+        return "Critical"
+    if any(k in low for k in TIMEY):
+        return "Time-Sensitive"
+    return "FYI"
+
+def _legacy_tag(low: str) -> str:
+    from src.keywords import TAG_RULES
+    for tag, keys in TAG_RULES:
+        if any(k in low for k in keys):
+            return tag
+    return "General"
+
+def _legacy_cta(low: str) -> int:
+    from src.keywords import CTA
+    return sum(2 for w in CTA if w in low)
+
+def _occurrences(low: str, kw: str):
+    """Start of every occurrence of `kw` in `low`, overlapping ones included."""
+    i = low.find(kw)
+    while i != -1:
+        yield i
+        i = low.find(kw, i + 1)
+
+def cmd_keywords(args):
+    """Equivalence check against the any(k in low ...) classifiers, then a timing comparison."""
+    from src.analyze import _clean_caption, _sentence_spans, classify_importance
+    from src.keywords import ENGINE, categories, keywords_in, reason_tag
+
+    caps = [_clean_caption(it["caption"]) for it in _load_captions(args.corpus, args.limit)]
+    spans = [_sentence_spans(c)[:8] for c in caps]  # both sides get sentence splitting for free
+    sentences = [[p for _, _, p in sp] for sp in spans]
+    mismatches = 0
+    for cap in caps:
+        hits = ENGINE.scan(cap)
+        low = cap.lower()
+        mismatches += classify_importance(cap, kw_hits=hits) != _legacy_importance(low)
+        mismatches += reason_tag(cap, hits) != _legacy_tag(low)
+        for start, end, p in _sentence_spans(cap)[:8]:
+            mismatches += 2 * len(keywords_in(hits, "cta", start, end)) != _legacy_cta(p.lower())
+    print(f"[BENCH] {len(caps)} captions, {mismatches} mismatches against the legacy classifiers")
+    # Raw hits must equal every occurrence `kw in text.lower()` would find, position for position
+    for cap in caps:
+        low = cap.lower()
+        expected = sorted((i, i + len(k), k) for k in ENGINE.categories for i in _occurrences(low, k))
+        got = [h[:3] for h in ENGINE.scan(cap)]
+        assert got == expected, f"keyword hits differ from substring search for {cap[:80]!r}: {got} != {expected}"
+    assert mismatches == 0, f"{mismatches} mismatches against the legacy classifiers"
+
+    started = time.perf_counter()
+    for cap, sents in zip(caps, sentences):
+        low = cap.lower()
+        _legacy_importance(low), _legacy_tag(low)
+        for p in sents:
+            _legacy_cta(p.lower())
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for cap, sp in zip(caps, spans):
+        hits = ENGINE.scan(cap)
+        categories(hits)
+        reason_tag(cap, hits)
+        for start, end, _ in sp:
+            keywords_in(hits, "cta", start, end)
+    engine_s = time.perf_counter() - started
+    print(f"[BENCH] legacy scans {len(caps) / legacy_s:,.0f} captions/s | engine {len(caps) / engine_s:,.0f} captions/s")
+
+def cmd_analyze(args):
+    """analyze_items scaling: items/s per worker count, each run with an empty date memo."""
+    from src import utils
+    from src.analyze import analyze_items
+
+    items = _load_captions(args.corpus, args.limit)
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        utils._date_memo, utils._date_memo_new = {}, {}  # cold: every run (and forked worker) parses every caption
+        started = time.perf_counter()
+        out = analyze_items(items, workers=workers)
+        secs = time.perf_counter() - started
+        if baseline is None:
+            baseline = (out, secs)
+        same = "identical" if out == baseline[0] else "MISMATCH"
+        print(f"[BENCH] {workers} workers: {len(items) / secs:.1f} items/s "
+              f"(x{baseline[1] / secs:.2f}), output {same} to the first run")
+    print(f"[BENCH] {os.cpu_count()} CPUs available")
+
+# Entry points whose cold start we track; each must import without doing any work
+STARTUP_MODULES = ["main", "jarvis"]
+
+def _import_us(module: str) -> tuple:
+    """(total import time in us, its three slowest dependencies) from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if line.endswith("| site"):
+            rows = []  # everything so far was interpreter startup, not the entry point
+            continue
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.strip()))
+    total = next(us for us, name in reversed(rows) if name == module)
+    slowest = sorted((r for r in rows if r[1] != module), reverse=True)[:3]
+    return total, slowest
+
+def cmd_startup(args):
+    """Cold import time per entry point, plus a main.py --dry-run over an empty corpus."""
+    for module in STARTUP_MODULES:
+        runs = [_import_us(module) for _ in range(args.repeat)]
+        best, slowest = min(runs)
+        top = ", ".join(f"{name} {us / 1000:.0f}ms" for us, name in slowest)
+        print(f"[BENCH] import {module}: {best / 1000:.0f}ms (best of {args.repeat}) | slowest: {top}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, "empty.jsonl.gz")
+        gzip.open(corpus, "wt").close()
+        env = dict(os.environ, POST_SOURCE="replay", POST_SOURCE_PATH=corpus, JARVIS_CACHE_DIR=tmp)
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--dry-run"], env=env, check=True, stdout=subprocess.DEVNULL)
+        print(f"[BENCH] main.py --dry-run, no new posts: {time.perf_counter() - started:.2f}s wall")
+
+def cmd_summarize(args):
+    """jarvis.py summaries: captions/s one at a time vs batched, both with an empty summary cache."""
+    import jarvis
+
+    captions = _bench_captions(args.corpus, args.limit)
+    summarizer = jarvis.load_summarizer()
+    if summarizer is None:
+        raise SystemExit("[BENCH] summarizer model not available (pip install transformers torch)")
+    rates = {}
+    for batch in (1, args.batch):
+        started = time.perf_counter()
+        jarvis.summarize_all(captions, summarizer, cache={}, batch_size=batch)
+        rates[batch] = len(captions) / (time.perf_counter() - started)
+    print(f"[BENCH] {len(captions)} captions: {rates[1]:.2f} captions/s one at a time | "
+          f"{rates[args.batch]:.2f} captions/s in batches of {args.batch} (x{rates[args.batch] / rates[1]:.2f})")
+
+def _synthetic_analyzed(n: int, seed: int = 7):
+    """Analyzed-item dicts with realistic field fill rates, for digest timing."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    items = []
+    for i in range(n):
+        start = now + timedelta(days=rng.randint(-3, 20), hours=rng.randint(0, 23))
+        dated = rng.random() < 0.8
+        items.append({
+            "account": f"club{rng.randint(0, 3000):05d}",
+            "url": f"https://www.instagram.com/p/S{i}/",
+            "summary": "Join us! Register at the link in bio.",
+            "importance": rng.choice(["Critical", "Time-Sensitive", "FYI"]),
+            "date_hint": start.strftime("%b %d") if dated else "",
+            "time_hint": start.strftime("%H:%M") if rng.random() < 0.5 else "",
+            "venue_hint": rng.choice(["", "hall", "Room DV2080"]),
+            "price_hint": rng.choice(["", "Free", "$5"]),
+            "contact_hint": rng.choice(["", "club@utoronto.ca"]),
+            "url_found": rng.choice(["", "https://example.com/apply"]),
+            "link_in_bio": rng.random() < 0.5,
+            "start_fmt": start.strftime("%Y%m%dT%H%M%S") if dated else "",
+            "end_fmt": (start + timedelta(hours=1)).strftime("%Y%m%dT%H%M%S") if dated else "",
+            "shortcode": f"S{i}",
+            "event_title": f"@club — Workshop ({i})",
+            **({"accounts": ["uoft", "uoftmississauga"]} if rng.random() < 0.1 else {}),
+        })
+    return items
+
+def cmd_digest(args):
+    """items_frame (vectorized sort keys + buckets) and markdown/HTML digest rendering times."""
+    import pandas  # noqa: F401 (import cost isn't digest cost)
+    from src.digest import build_html_digest, build_markdown_digest, items_frame
+
+    items = _synthetic_analyzed(args.items)
+    started = time.perf_counter()
+    frame = items_frame(items)
+    frame_s = time.perf_counter() - started
+    started = time.perf_counter()
+    frame.sort_values(["priority", "start_fmt", "account"], kind="stable").groupby("bucket").size()
+    order_s = time.perf_counter() - started
+    started = time.perf_counter()
+    html = build_html_digest(frame)
+    html_s = time.perf_counter() - started
+    started = time.perf_counter()
+    build_markdown_digest(frame)
+    md_s = time.perf_counter() - started
+    print(f"[BENCH] {args.items} items: frame {frame_s * 1000:.0f}ms | sort+bucket {order_s * 1000:.0f}ms | "
+          f"html {html_s * 1000:.0f}ms ({len(html) / 1e6:.0f} MB) | markdown {md_s * 1000:.0f}ms")
+
+def cmd_render(args):
+    """HTML digest render time and peak traced memory: cold memo, warm memo, and streamed to a file."""
+    import tracemalloc
+    import pandas  # noqa: F401 (import cost isn't render cost)
+    from src import digest
+
+    def measure(fn):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn()
+        secs = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return f"{secs * 1000:.0f}ms, peak {peak / 2**20:.1f} MB"
+
+    for n in [int(x) for x in args.items.split(",")]:
+        frame = digest.items_frame(_synthetic_analyzed(n))
+        digest._CARD_MEMO.clear()
+        digest._MD_MEMO.clear()
+        cold = measure(lambda: digest.build_html_digest(frame))
+        warm = measure(lambda: digest.build_html_digest(frame))
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            streamed = measure(lambda: digest.write_html_digest(frame, out))
+        print(f"[BENCH] {n} items: cold {cold} | warm {warm} | streamed (warm) {streamed}")
+
+def cmd_ics(args):
+    """ICS writer throughput: the three calendar outputs built separately vs in one pass, and folding/CRLF checks."""
+    from src.ics import build_calendars, build_ics, build_invite_blocks, build_per_event_ics
+
+    items = _synthetic_analyzed(args.events)
+    for it in items[::7]:
+        it["summary"] = "Ünïcödé summary, long enough to be folded; with commas — and an emoji 🎉 " * 3
+    n = sum(bool(it["start_fmt"]) for it in items)
+
+    started = time.perf_counter()
+    build_ics(items)
+    build_per_event_ics(items)
+    build_invite_blocks(items, "jarvis@example.com", "you@example.com")
+    separate_s = time.perf_counter() - started
+    started = time.perf_counter()
+    cals = build_calendars(items, "jarvis@example.com", "you@example.com")
+    one_pass_s = time.perf_counter() - started
+
+    blobs = [cals["combined"][1]] + [b for _, b, _ in cals["per_event"]] + [b for _, b in cals["invites"]]
+    too_long = sum(len(line) > 75 for b in blobs for line in b.split(b"\r\n"))
+    bare_lf = sum(b.replace(b"\r\n", b"").count(b"\n") for b in blobs)
+    print(f"[BENCH] {n} events: separate builders {separate_s:.2f}s ({n / separate_s:,.0f} events/s) | "
+          f"one pass {one_pass_s:.2f}s ({n / one_pass_s:,.0f} events/s) | "
+          f"combined {len(cals['combined'][1]) / 1e6:.1f} MB | lines > 75 octets: {too_long} | bare LF: {bare_lf}")
+
+_NOTION_SCHEMA = {"Name": {"type": "title"}, "Shortcode": {"type": "rich_text"}, "Account": {"type": "select"},
+                  "Importance": {"type": "select"}, "Date": {"type": "date"}, "URL": {"type": "url"}}
+
+def _notion_standin(limit_every: int = 0):
+    """
+    A minimal in-memory Notion API on localhost (databases retrieve/query, pages create/update,
+    block children list/append, block delete) that enforces the text/block limits and, if
+    `limit_every` is set, answers every Nth request with 429. Returns (server, state).
+    """
+    import threading
+    import uuid
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"pages": {}, "blocks": {}, "requests": 0, "times": [], "errors": []}
+    lock = threading.Lock()
+    schema = _NOTION_SCHEMA
+
+    def check_blocks(children):
+        if len(children) > 100:
+            return "more than 100 blocks in one request"
+        for b in children:
+            for t in b[b["type"]].get("rich_text", []):
+                if len(t["text"]["content"]) > 2000:
+                    return "rich text over 2000 characters"
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _reply(self, status, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status, code, message, headers=()):
+            self._reply(status, {"object": "error", "status": status, "code": code, "message": message}, headers)
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            parts = self.path.split("?")[0].strip("/").split("/")[1:]  # drop "v1"
+            with lock:
+                state["requests"] += 1
+                state["times"].append(time.monotonic())
+                n = state["requests"]
+            if limit_every and n % limit_every == 0:
+                return self._error(429, "rate_limited", "slow down", [("Retry-After", "0")])
+            m = self.command
+            with lock:
+                if parts[0] == "databases" and m == "GET":
+                    return self._reply(200, {"object": "database", "id": parts[1], "properties": schema})
+                if parts[0] == "databases" and parts[-1] == "query":
+                    results = [{"object": "page", "id": pid, "properties": {"Shortcode": {"rich_text": [
+                        {"plain_text": p["properties"]["Shortcode"]["rich_text"][0]["text"]["content"]}]}}}
+                        for pid, p in state["pages"].items()]
+                    return self._reply(200, {"object": "list", "results": results, "has_more": False, "next_cursor": None})
+                if parts[0] == "pages" and m == "POST":
+                    err = check_blocks(body.get("children", []))
+                    if err:
+                        state["errors"].append(err)
+                        return self._error(400, "validation_error", err)
+                    pid = str(uuid.uuid4())
+                    state["pages"][pid] = {"properties": body["properties"]}
+                    state["blocks"][pid] = [(str(uuid.uuid4()), b) for b in body.get("children", [])]
+                    return self._reply(200, {"object": "page", "id": pid})
+                if parts[0] == "pages" and m == "PATCH":
+                    state["pages"][parts[1]]["properties"].update(body.get("properties", {}))
+                    return self._reply(200, {"object": "page", "id": parts[1]})
+                if parts[0] == "blocks" and parts[-1] == "children" and m == "GET":
+                    results = [{"object": "block", "id": bid, "type": b["type"]} for bid, b in state["blocks"].get(parts[1], [])]
+                    return self._reply(200, {"object": "list", "results": results, "has_more": False, "next_cursor": None})
+                if parts[0] == "blocks" and parts[-1] == "children" and m == "PATCH":
+                    err = check_blocks(body.get("children", []))
+                    if err:
+                        state["errors"].append(err)
+                        return self._error(400, "validation_error", err)
+                    new = [(str(uuid.uuid4()), b) for b in body["children"]]
+                    state["blocks"].setdefault(parts[1], []).extend(new)
+                    return self._reply(200, {"object": "list", "results": [{"object": "block", "id": bid, "type": b["type"]}
+                                                                           for bid, b in new]})
+                if parts[0] == "blocks" and m == "PATCH":
+                    for blocks in state["blocks"].values():
+                        for i, (bid, b) in enumerate(blocks):
+                            if bid == parts[1]:
+                                blocks[i] = (bid, {**b, **body})
+                    return self._reply(200, {"object": "block", "id": parts[1]})
+                if parts[0] == "blocks" and m == "DELETE":
+                    for pid, blocks in state["blocks"].items():
+                        state["blocks"][pid] = [(bid, b) for bid, b in blocks if bid != parts[1]]
+                    return self._reply(200, {"object": "block", "id": parts[1]})
+            return self._error(404, "object_not_found", self.path)
+
+        do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def cmd_notion(args):
+    """
+    NotionSync against a local stand-in: first sync creates every page, a rerun costs no page
+    requests, a partial change updates only those pages, and a lost index doesn't duplicate pages.
+    Also pushes an oversized jarvis.py report (block chunking/batching).
+    """
+    from src.notion_push import NotionApi, NotionSync, paragraph_blocks
+
+    server, state = _notion_standin(limit_every=25)
+    base = f"http://127.0.0.1:{server.server_port}"
+    index_path = os.path.join(tempfile.mkdtemp(prefix="jarvis-notion-"), "notion_index.json")
+    items = _synthetic_analyzed(args.items)
+
+    def run(label, batch):
+        api = NotionApi(token="secret", base_url=base, rate=args.rate, burst=args.rate)
+        sync = NotionSync("db", api=api, index_path=index_path)
+        state["times"].clear()
+        started = time.perf_counter()
+        stats = sync.sync(batch)
+        secs = time.perf_counter() - started
+        t = state["times"]
+        peak = max((sum(1 for x in t if s <= x < s + 1) for s in t), default=0)
+        print(f"[BENCH] {label}: {secs:.2f}s | {stats} | {api.requests} requests ({api.retries} retried 429s), "
+              f"peak {peak}/s | pages in Notion: {len(state['pages'])}")
+
+    def bodies_match():
+        sync = NotionSync("db", api=NotionApi(token="secret", base_url=base), index_path=None)
+        sync._schema = {name: col["type"] for name, col in _NOTION_SCHEMA.items()}
+        want = {it["shortcode"]: [sync.content_hash(b) for b in sync.children(it)] for it in items}
+        got = {p["properties"]["Shortcode"]["rich_text"][0]["text"]["content"]:
+               [sync.content_hash(b) for _, b in state["blocks"][pid]] for pid, p in state["pages"].items()}
+        return want == got
+
+    run("first sync", items)
+    run("rerun, nothing changed", items)
+    for it in items[::10]:
+        it["summary"] += " Updated!"
+    run("10% changed", items)
+    for it in items[::10]:
+        it["summary"] += " Again!"
+    run("same 10% changed again", items)
+    os.remove(index_path)
+    run("index lost", items)
+    print(f"[BENCH] page bodies match the items: {bodies_match()}")
+
+    report = "\n".join(f"- @club{i:04d} [FYI] " + "word " * 60 for i in range(1500))
+    api = NotionApi(token="secret", base_url=base, rate=args.rate, burst=args.rate)
+    blocks = paragraph_blocks(report)
+    api.create_page({"page_id": "parent"}, {"title": [{"type": "text", "text": {"content": "report"}}]}, blocks)
+    print(f"[BENCH] {len(report) / 1000:.0f}k-char report: {len(blocks)} blocks in {api.requests} requests | "
+          f"limit violations seen by the stand-in: {len(state['errors'])}")
+    server.shutdown()
+
+def cmd_smtp(args):
+    """
+    send_email fan-out against a local aiosmtpd server: pooled vs a fresh connection per
+    message, and a check that every recipient got their own To header and invite ATTENDEE.
+    First, messages are queued while the server is down; they must go out first once it's up.
+    """
+    import socket
+    from aiosmtpd.controller import Controller
+
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append((envelope.rcpt_tos[0], envelope.content))
+            return "250 OK"
+
+    with socket.socket() as probe:  # a free port; aiosmtpd can't self-test on port 0
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = Controller(Handler(), hostname="127.0.0.1", port=port)
+    os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_SSL": "0", "SMTP_AUTH": "0",
+                       "GMAIL_ADDRESS": "jarvis@example.com", "OUTBOX_BACKOFF_SEC": "60",
+                       "JARVIS_CACHE_DIR": tempfile.mkdtemp(prefix="jarvis-smtp-")})
+    from src.digest import build_html_digest, build_markdown_digest
+    from src.ics import build_ics, build_invite_blocks
+    from src.outbox import Outbox
+    from src.send_email import INVITE_ATTENDEE, queue_email, send_email
+
+    items = _synthetic_analyzed(args.items)
+    invites = build_invite_blocks(items, organizer_email="jarvis@example.com", attendee_email=INVITE_ATTENDEE)
+    combo_name, combo_bytes = build_ics(items)
+    attachments = [(combo_name, combo_bytes, "text/calendar")] if combo_name else []
+    html, md = build_html_digest(items), build_markdown_digest(items)
+    recipients = [f"member{i:04d}@example.com" for i in range(args.recipients)]
+
+    # Server down: the first attempt fails and everything stays spooled, in backoff for the next minute
+    stranded = [f"earlier{i:02d}@example.com" for i in range(10)]
+    queue_email("Jarvis Brief (earlier run)", html, md, attachments, invites, recipients=stranded)
+    Outbox().drain(max_seconds=0)
+    print(f"[BENCH] server down: {len(Outbox())} message(s) left in the outbox")
+
+    controller.start()
+    try:
+        for label, pooled in [("pooled", True), ("connection per message", False)]:
+            received.clear()
+            started = time.perf_counter()
+            if pooled:
+                send_email("Jarvis Brief", html, md, attachments, invites, recipients=recipients)
+            else:
+                for r in recipients:
+                    send_email("Jarvis Brief", html, md, attachments, invites, recipients=[r])
+            secs = time.perf_counter() - started
+            if pooled:
+                # leftovers are tried despite their backoff, and all before today's messages
+                first = [r for r, _ in received[:len(stranded)]]
+                print(f"[BENCH] outbox recovered: {sum(r in stranded for r, _ in received)}/{len(stranded)} sent, "
+                      f"all before today's: {set(first) == set(stranded)}")
+                received[:] = [(r, body) for r, body in received if r not in stranded]
+            ok = sum(f"To: {r}".encode() in body and f"mailto:{r}".encode() in body.replace(b"\r\n ", b"")
+                     and INVITE_ATTENDEE.encode() not in body for r, body in received)
+            print(f"[BENCH] {label}: {len(received)} messages in {secs:.2f}s "
+                  f"({len(received) / secs:.1f} msg/s, {len(received[0][1]) / 1024:.0f} KB each) | "
+                  f"correctly addressed: {ok}/{len(recipients)} | left in outbox: {len(Outbox())}")
+    finally:
+        controller.stop()
+
+def _bench_captions(path: str, limit: int):
+    """The first `limit` distinct captions: a fixed set, so backends are compared on the same text."""
+    return list(dict.fromkeys(it["caption"] for it in _load_captions(path, limit * 4)))[:limit]
+
+def _backend_run(backend: str, corpus: str, limit: int):
+    """Runs in its own process so peak RSS is this backend's alone; prints one JSON line."""
+    import resource
+    import jarvis
+
+    captions = _bench_captions(corpus, limit)
+    started = time.perf_counter()
+    summarizer = jarvis.load_summarizer(backend)
+    load_s = time.perf_counter() - started
+    if summarizer is None:
+        print(json.dumps({"error": "model not available"}))
+        return
+    started = time.perf_counter()
+    summaries = jarvis.summarize_all(captions, summarizer, cache={})
+    print(json.dumps({
+        "load_s": load_s,
+        "per_caption_ms": (time.perf_counter() - started) / len(captions) * 1000,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "summaries": summaries,
+    }))
+
+def _rouge_l(a: str, b: str) -> float:
+    """ROUGE-L F1 over lowercase word tokens."""
+    x, y = a.lower().split(), b.lower().split()
+    if not x or not y:
+        return float(x == y)
+    prev = [0] * (len(y) + 1)
+    for xi in x:
+        cur = [0]
+        for j, yj in enumerate(y):
+            cur.append(prev[j] + 1 if xi == yj else max(prev[j + 1], cur[j]))
+        prev = cur
+    lcs = prev[-1]
+    if not lcs:
+        return 0.0
+    p, r = lcs / len(x), lcs / len(y)
+    return 2 * p * r / (p + r)
+
+def cmd_backends(args):
+    """Load time, per-caption latency and peak RSS per SUM_BACKEND, and summary agreement with fp32."""
+    results = {}
+    for backend in args.backends.split(","):
+        code = f"import bench; bench._backend_run({backend!r}, {args.corpus!r}, {args.limit})"
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+        res = json.loads(lines[-1]) if lines else {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+        results[backend] = res
+        if "error" in res:
+            print(f"[BENCH] {backend}: {res['error']}")
+            continue
+        line = f"[BENCH] {backend}: load {res['load_s']:.1f}s | {res['per_caption_ms']:.0f} ms/caption | peak RSS {res['rss_mb']:.0f} MB"
+        ref = results.get("fp32", {}).get("summaries")
+        if ref and backend != "fp32":
+            pairs = list(zip(ref, res["summaries"]))
+            exact = sum(a == b for a, b in pairs) / len(pairs)
+            rouge = sum(_rouge_l(a, b) for a, b in pairs) / len(pairs)
+            line += f" | vs fp32: {exact:.0%} identical, ROUGE-L F1 {rouge:.3f}"
+        print(line)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("corpus", help="write a synthetic corpus")
+    p.add_argument("--posts", type=int, default=10000)
+    p.add_argument("--accounts", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.set_defaults(func=cmd_corpus)
+
+    p = sub.add_parser("pipeline", help="replay a corpus through main.run (no delivery)")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--profile", action="store_true", help="print a cProfile summary")
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser("dates", help="dateparser calls per analyzed item")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=2000)
+    p.set_defaults(func=cmd_dates)
+
+    p = sub.add_parser("keywords", help="keyword engine equivalence + microbenchmark")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=20000)
+    p.set_defaults(func=cmd_keywords)
+
+    p = sub.add_parser("parse", help="analyze_item latency and allocation with dateparser memoized")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=2000)
+    p.set_defaults(func=cmd_parse)
+
+    p = sub.add_parser("analyze", help="analyze_items scaling across worker counts")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=4000)
+    p.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("startup", help="cold-start import time per entry point (python -X importtime)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser("summarize", help="jarvis.py summarization, one at a time vs batched")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=64)
+    p.add_argument("--batch", type=int, default=8)
+    p.set_defaults(func=cmd_summarize)
+
+    p = sub.add_parser("digest", help="digest ordering and rendering time for synthetic analyzed items")
+    p.add_argument("--items", type=int, default=100000)
+    p.set_defaults(func=cmd_digest)
+
+    p = sub.add_parser("render", help="HTML digest render time/memory, cold vs memoized vs streamed")
+    p.add_argument("--items", default="1000,50000")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("ics", help="ICS writer throughput (combined + per-event + invites)")
+    p.add_argument("--events", type=int, default=100000)
+    p.set_defaults(func=cmd_ics)
+
+    p = sub.add_parser("notion", help="Notion sync requests/idempotency against a local API stand-in")
+    p.add_argument("--items", type=int, default=200)
+    p.add_argument("--rate", type=float, default=20, help="requests/s for the token bucket")
+    p.set_defaults(func=cmd_notion)
+
+    p = sub.add_parser("smtp", help="send_email fan-out msg/s against a local SMTP stand-in")
+    p.add_argument("--recipients", type=int, default=200)
+    p.add_argument("--items", type=int, default=50, help="analyzed items (invites) per digest")
+    p.set_defaults(func=cmd_smtp)
+
+    p = sub.add_parser("backends", help="SUM_BACKEND latency/memory and agreement with fp32")
+    p.add_argument("--corpus", default=os.path.join(".cache", "bench-corpus.jsonl.gz"))
+    p.add_argument("--limit", type=int, default=32)
+    p.add_argument("--backends", default=",".join(["fp32", "int8", "onnx"]))
+    p.set_defaults(func=cmd_backends)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
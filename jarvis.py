@@ -1,155 +1,235 @@
-import os, re, json, smtplib, time
+import os, re, time, hashlib
 from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
 from dateutil import tz
-import pandas as pd
-import instaloader
+
+# Importing this module does no I/O: the scrape, model load and delivery all run from main().
+# pandas, instaloader and transformers are imported where they're first needed.
 
 # ---- Time setup ----
 LOCAL_TZ = tz.gettz("America/Toronto")
-NOW_UTC = datetime.now(timezone.utc)
-SINCE_UTC = NOW_UTC - timedelta(days=int(os.getenv("LOOKBACK_DAYS", "1")))
-
-# ---- Accounts ----
-with open("accounts.txt", "r", encoding="utf-8") as f:
-    ACCOUNTS = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
-
-# ---- Instaloader config ----
-L = instaloader.Instaloader(
-    download_pictures=False,
-    download_video_thumbnails=False,
-    download_videos=False,
-    download_comments=False,
-    save_metadata=False,
-    compress_json=False,
-    dirname_pattern=".",
-    filename_pattern="{shortcode}"
-)
-
-IG_USER = os.getenv("IG_USERNAME")
-IG_PASS = os.getenv("IG_PASSWORD")
-if IG_USER and IG_PASS:
-    try:
-        L.login(IG_USER, IG_PASS)
-        print("Logged in to Instagram.")
-    except Exception as e:
-        print("Login failed; continuing without login:", e)
+LOOKBACK_DAYS = int(os.getenv("LOOKBACK_DAYS", "1"))
+
+# ---- Summarizer (local HF model) ----
+MODEL_NAME = os.getenv("MODEL_NAME", "sshleifer/distilbart-cnn-12-6")  # good quality & fast
+# fp32: plain PyTorch | int8: dynamically quantized Linear layers (PyTorch) | onnx: exported model on
+# onnxruntime (needs `optimum[onnxruntime]`). Converted models are cached under .cache/models.
+SUM_BACKEND = os.getenv("SUM_BACKEND", "fp32")
+SUM_BACKENDS = ("fp32", "int8", "onnx")
+MAX_LEN = int(os.getenv("SUM_MAX_TOKENS", "96"))
+MIN_LEN = int(os.getenv("SUM_MIN_TOKENS", "24"))
+SUM_MAX_CHARS = 1200  # captions are cut to this before summarizing
+SUM_BATCH_SIZE = int(os.getenv("SUM_BATCH_SIZE", "8"))  # captions per forward pass; 1 = one at a time
+SUM_THREADS = int(os.getenv("SUM_THREADS", "0"))  # torch intra-op threads; 0 = torch's default
+SUMMARY_CACHE_TTL_DAYS = float(os.getenv("SUMMARY_CACHE_TTL_DAYS", "30"))
+
+# ---- Delivery ----
+GMAIL_USER = os.getenv("GMAIL_USER")
+GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
+TO_EMAIL = os.getenv("TO_EMAIL", GMAIL_USER or "")
+NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+NOTION_PAGE_ID = os.getenv("NOTION_PAGE_ID")
+
+def read_accounts(path="accounts.txt"):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
 
 def clean_text(t):
     t = re.sub(r'\s+', ' ', t or '').strip()
     return t
 
-posts_data = []
-for i, handle in enumerate(ACCOUNTS, 1):
+def fetch_posts(accounts, since_utc):
+    """Posts in the window, via the shared session + profile cache with main.py."""
+    from src.sources import LiveSource
+    source = LiveSource()
+
+    posts_data = []
+    for i, handle in enumerate(accounts, 1):
+        try:
+            count_added = 0
+            if source.is_quiet(handle, since_utc.replace(tzinfo=None)):
+                print(f"@{handle}: quiet (cached), skipped.")
+                continue
+            for post in source.iter_posts(handle, skip_unchanged=False):  # report the whole window, not just unseen posts
+                created_utc = post.date_utc.replace(tzinfo=timezone.utc)
+                if created_utc < since_utc:
+                    break  # posts are reverse-chronological
+                caption = clean_text(post.caption)
+                posts_data.append({
+                    "account": handle,
+                    "shortcode": post.shortcode,
+                    "url": f"https://www.instagram.com/p/{post.shortcode}/",
+                    "created_utc": created_utc.isoformat(),
+                    "created_local": created_utc.astimezone(LOCAL_TZ).strftime("%Y-%m-%d %H:%M"),
+                    "caption": caption
+                })
+                count_added += 1
+            print(f"@{handle}: {count_added} posts in window.")
+        except Exception as e:
+            print(f"Failed on @{handle}: {e}")
+        time.sleep(float(os.getenv("ACCOUNT_DELAY_SEC", "2")))  # gentle throttle
+    source.close()
+    return posts_data
+
+def _converted_model_path(backend):
+    from src.config import CACHE_DIR
+    return os.path.join(CACHE_DIR, "models", f"{MODEL_NAME.replace('/', '--')}-{backend}")
+
+def _load_model(backend):
+    """The seq2seq model for `backend`; int8/onnx conversions happen once and are reused from disk."""
+    path = _converted_model_path(backend)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        if os.path.isdir(path):
+            return ORTModelForSeq2SeqLM.from_pretrained(path)
+        model = ORTModelForSeq2SeqLM.from_pretrained(MODEL_NAME, export=True)
+        model.save_pretrained(path)
+        return model
+
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+    if backend == "int8":
+        pt_path = path + ".pt"
+        if os.path.exists(pt_path):
+            return torch.load(pt_path, weights_only=False)  # whole pickled module; skips the fp32 load
+        model = torch.quantization.quantize_dynamic(
+            AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME).eval(), {torch.nn.Linear}, dtype=torch.qint8)
+        os.makedirs(os.path.dirname(pt_path), exist_ok=True)
+        torch.save(model, pt_path)
+        return model
+    return AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME).eval()
+
+def load_summarizer(backend=None):
+    """The HF summarization pipeline on `backend` (default SUM_BACKEND), or None (captions get truncated instead)."""
+    backend = backend or SUM_BACKEND
+    if backend not in SUM_BACKENDS:
+        print(f"Unknown SUM_BACKEND={backend!r}, using fp32")
+        backend = "fp32"
     try:
-        profile = instaloader.Profile.from_username(L.context, handle)
-        count_added = 0
-        for post in profile.get_posts():
-            created_utc = post.date_utc.replace(tzinfo=timezone.utc)
-            if created_utc < SINCE_UTC:
-                break  # posts are reverse-chronological
-            caption = clean_text(post.caption)
-            posts_data.append({
-                "account": handle,
-                "shortcode": post.shortcode,
-                "url": f"https://www.instagram.com/p/{post.shortcode}/",
-                "created_utc": created_utc.isoformat(),
-                "created_local": created_utc.astimezone(LOCAL_TZ).strftime("%Y-%m-%d %H:%M"),
-                "caption": caption
-            })
-            count_added += 1
-        print(f"@{handle}: {count_added} posts in window.")
+        from transformers import AutoTokenizer, pipeline
+        if SUM_THREADS > 0:
+            import torch
+            torch.set_num_threads(SUM_THREADS)
+        started = time.perf_counter()
+        model = _load_model(backend)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        summarizer = pipeline("summarization", model=model, tokenizer=tokenizer,
+                              **({"framework": "pt"} if backend != "onnx" else {}))
+        print(f"Loaded summarizer model: {MODEL_NAME} ({backend}) in {time.perf_counter() - started:.1f}s")
+        return summarizer
     except Exception as e:
-        print(f"Failed on @{handle}: {e}")
-    time.sleep(float(os.getenv("ACCOUNT_DELAY_SEC", "2")))  # gentle throttle
+        print("Summarizer not available, will fallback to truncated captions. Error:", e)
+        return None
 
-df = pd.DataFrame(posts_data).sort_values("created_utc", ascending=False)
+def _summary_input(caption):
+    return (caption or "").strip()[:SUM_MAX_CHARS]
 
-# ---- Summarizer (local HF model) ----
-MODEL_NAME = os.getenv("MODEL_NAME", "sshleifer/distilbart-cnn-12-6")  # good quality & fast
-MAX_LEN = int(os.getenv("SUM_MAX_TOKENS", "96"))
-MIN_LEN = int(os.getenv("SUM_MIN_TOKENS", "24"))
-
-summary_available = False
-try:
-    from transformers import pipeline
-    summarizer = pipeline("summarization", model=MODEL_NAME, framework="pt")
-    summary_available = True
-    print(f"Loaded summarizer model: {MODEL_NAME}")
-except Exception as e:
-    print("Summarizer not available, will fallback to truncated captions. Error:", e)
-
-def summarize_text(txt, max_chars=1200):
-    txt = (txt or "").strip()
-    if not txt:
-        return ""
-    txt = txt[:max_chars]
-    if summary_available:
-        try:
-            out = summarizer(txt, max_length=MAX_LEN, min_length=MIN_LEN, do_sample=False)
-            return out[0]["summary_text"].strip()
-        except Exception as e:
-            print("Summarization error:", e)
-    # fallback
+def _fallback_summary(txt):
     return (txt[:180] + ("…" if len(txt) > 180 else ""))
 
-def reason_tag(txt):
-    t = (txt or "").lower()
-    # weight-based quick scoring
-    rules = [
-        ("Deadline", ["deadline", "apply", "register", "due", "closes", "last day", "rsvp by"]),
-        ("Event", ["event", "workshop", "seminar", "talk", "webinar", "info session", "orientation", "panel"]),
-        ("Hiring", ["hiring", "recruit", "applications open", "positions", "intern", "apply now", "join our team"]),
-        ("Funding", ["scholarship", "grant", "bursary", "funding"]),
-        ("Competition", ["case competition", "hackathon", "pitch", "moot", "debate"]),
-        ("Academic", ["exam", "midterm", "lecture", "class", "tutorial", "assignment"]),
-        ("Admin", ["closure", "hours", "update", "policy", "procedure"]),
-    ]
-    for tag, keys in rules:
-        if any(k in t for k in keys):
-            return tag
-    return "General"
-
-if not df.empty:
-    df["summary"] = df["caption"].apply(summarize_text)
-    df["tag"] = df["caption"].apply(reason_tag)
-else:
-    df["summary"] = []
-    df["tag"] = []
-
-# ---- Build Markdown report ----
-date_str = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d")
-title = f"Instagram Morning Brief — {date_str}"
-lines = [f"# {title}", "", f"_Covers posts since last {int(os.getenv('LOOKBACK_DAYS','1'))} day(s) — generated {datetime.now(LOCAL_TZ).strftime('%Y-%m-%d %H:%M %Z')}_", ""]
-
-if df.empty:
-    lines.append("> No new posts from your tracked accounts in the last window.")
-else:
-    grouped = df.groupby("account")
-    for acct, g in grouped:
-        lines.append(f"## @{acct}")
-        for _, r in g.iterrows():
-            lines.append(f"- **{r['tag']}** — {r['created_local']} — {r['url']}")
-            if r["summary"]:
-                lines.append(f"  - {r['summary']}")
-            if r["caption"]:
-                cap = r["caption"][:320]
-                lines.append(f"  - _Orig:_ {cap}{'…' if len(r['caption'])>320 else ''}")
-        lines.append("")
+def _summary_key(txt):
+    """Same caption, model, backend and length limits -> same summary."""
+    raw = "\0".join([MODEL_NAME, SUM_BACKEND, str(MAX_LEN), str(MIN_LEN), txt])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
-report_md = "\n".join(lines)
+def load_summary_cache():
+    """{key: {"summary": str, "used": iso date}}, minus entries unused for SUMMARY_CACHE_TTL_DAYS."""
+    from src.utils import load_json
+    from src.config import SUMMARY_CACHE_PATH
+    cache = load_json(SUMMARY_CACHE_PATH, default={})
+    oldest = (datetime.now() - timedelta(days=SUMMARY_CACHE_TTL_DAYS)).date().isoformat()
+    return {k: v for k, v in cache.items() if v.get("used", "") >= oldest}
 
-os.makedirs("reports", exist_ok=True)
-report_path = f"reports/{date_str}.md"
-with open(report_path, "w", encoding="utf-8") as f:
-    f.write(report_md)
+def save_summary_cache(cache):
+    from src.utils import save_json
+    from src.config import SUMMARY_CACHE_PATH
+    save_json(SUMMARY_CACHE_PATH, cache)
 
-print(f"Report generated at {report_path}")
+def uncached_captions(captions, cache):
+    return [c for c in captions if _summary_input(c) and _summary_key(_summary_input(c)) not in cache]
 
-# ---- Email delivery (optional) ----
-GMAIL_USER = os.getenv("GMAIL_USER")
-GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
-TO_EMAIL = os.getenv("TO_EMAIL", GMAIL_USER or "")
+def summarize_all(captions, summarizer=None, cache=None, batch_size=SUM_BATCH_SIZE):
+    """
+    One summary per caption, in order. Cache hits are reused; the rest go to the model
+    sorted by length (less padding per batch) in batches of `batch_size`. Without a model,
+    or if a caption fails, it falls back to the truncated caption (never cached).
+    """
+    cache = {} if cache is None else cache
+    today = datetime.now().date().isoformat()
+    texts = [_summary_input(c) for c in captions]
+    todo = sorted({t for t in texts if t and _summary_key(t) not in cache}, key=len)
+
+    if todo and summarizer is not None:
+        started = time.perf_counter()
+        done = 0
+        for i in range(0, len(todo), batch_size):
+            batch = todo[i:i + batch_size]
+            try:
+                outs = summarizer(batch, max_length=MAX_LEN, min_length=MIN_LEN, do_sample=False, batch_size=batch_size)
+            except Exception as e:
+                print("Summarization error:", e)
+                outs = []
+                for txt in batch if len(batch) > 1 else []:  # find the caption that broke the batch
+                    try:
+                        outs.append(summarizer(txt, max_length=MAX_LEN, min_length=MIN_LEN, do_sample=False)[0])
+                    except Exception as e:
+                        print("Summarization error:", e)
+                        outs.append(None)
+            for txt, out in zip(batch, outs):
+                if out is None:
+                    continue
+                cache[_summary_key(txt)] = {"summary": out["summary_text"].strip(), "used": today}
+                done += 1
+        secs = time.perf_counter() - started
+        print(f"Summarized {done} captions in {secs:.1f}s ({done / secs if secs else 0:.2f} captions/s, batch {batch_size}); "
+              f"{len(set(filter(None, texts))) - len(todo)} from cache")
+
+    summaries = []
+    for t in texts:
+        hit = cache.get(_summary_key(t)) if t else None
+        if hit:
+            hit["used"] = today
+            summaries.append(hit["summary"])
+        else:
+            summaries.append(_fallback_summary(t) if t else "")
+    return summaries
+
+def build_report(posts_data, summaries=None):
+    """(title, markdown, date_str) for the posts in the window; `summaries` lines up with posts_data."""
+    import pandas as pd
+    from src.keywords import reason_tag  # keywords.TAG_RULES, first match wins
+
+    df = pd.DataFrame(posts_data)
+    if not df.empty:
+        df["summary"] = summaries if summaries is not None else [_fallback_summary(_summary_input(c)) for c in df["caption"]]
+        df["tag"] = [reason_tag(c) for c in df["caption"]]
+        # Group by account, newest first within each: one sort instead of groupby + iterrows
+        df = df.sort_values(["account", "created_utc"], ascending=[True, False], kind="stable")
+        df["new_account"] = df["account"].ne(df["account"].shift())
+        df["orig"] = df["caption"].str.slice(0, 320) + df["caption"].str.len().gt(320).map({True: "…", False: ""})
+
+    # ---- Build Markdown report ----
+    date_str = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d")
+    title = f"Instagram Morning Brief — {date_str}"
+    lines = [f"# {title}", "", f"_Covers posts since last {LOOKBACK_DAYS} day(s) — generated {datetime.now(LOCAL_TZ).strftime('%Y-%m-%d %H:%M %Z')}_", ""]
+
+    if df.empty:
+        lines.append("> No new posts from your tracked accounts in the last window.")
+    else:
+        cols = ["new_account", "account", "tag", "created_local", "url", "summary", "orig"]
+        for i, (new_account, acct, tag, created_local, url, summary, orig) in enumerate(zip(*(df[c].tolist() for c in cols))):
+            if new_account:
+                if i:
+                    lines.append("")
+                lines.append(f"## @{acct}")
+            lines.append(f"- **{tag}** — {created_local} — {url}")
+            if summary:
+                lines.append(f"  - {summary}")
+            if orig:
+                lines.append(f"  - _Orig:_ {orig}")
+        lines.append("")
+
+    return title, "\n".join(lines), date_str
 
 def send_email(subject, body, to_email):
     msg = MIMEText(body, "plain", "utf-8")
@@ -161,43 +241,52 @@ def send_email(subject, body, to_email):
         server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
         server.sendmail(GMAIL_USER, [to_email], msg.as_string())
 
-if GMAIL_USER and GMAIL_APP_PASSWORD and TO_EMAIL:
-    try:
-        send_email(title, report_md, TO_EMAIL)
-        print("Email sent.")
-    except Exception as e:
-        print("Email failed:", e)
-else:
-    print("Email not configured; skipping email send.")
+def push_notion(title, report_md):
+    """The report as a child page of NOTION_PAGE_ID, split into blocks within Notion's per-block
+    text and per-request block limits."""
+    from src.notion_push import NotionApi, paragraph_blocks
 
-# ---- Notion delivery (optional) ----
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-NOTION_PAGE_ID = os.getenv("NOTION_PAGE_ID")
-if NOTION_TOKEN and NOTION_PAGE_ID:
-    import requests
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "parent": {"page_id": NOTION_PAGE_ID},
-        "properties": {
-            "title": [{"type": "text", "text": {"content": title}}]
-        },
-        "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [{"type": "text", "text": {"content": report_md}}]
-                }
-            }
-        ]
-    }
-    try:
-        r = requests.post("https://api.notion.com/v1/pages",
-                          headers=headers, data=json.dumps(payload))
-        print("Notion status:", r.status_code)
-    except Exception as e:
-        print("Notion push failed:", e)
+    api = NotionApi(token=NOTION_TOKEN)
+    blocks = paragraph_blocks(report_md)
+    page_id = api.create_page({"page_id": NOTION_PAGE_ID},
+                              {"title": [{"type": "text", "text": {"content": title}}]}, blocks)
+    print(f"Notion page created: {page_id} ({len(blocks)} blocks, {api.requests} requests)")
+
+def main():
+    since_utc = datetime.now(timezone.utc) - timedelta(days=LOOKBACK_DAYS)
+    posts_data = fetch_posts(read_accounts(), since_utc)
+
+    # Only load the model if some caption isn't in the summary cache
+    captions = [p["caption"] for p in posts_data]
+    cache = load_summary_cache()
+    summarizer = load_summarizer() if uncached_captions(captions, cache) else None
+    summaries = summarize_all(captions, summarizer, cache)
+    save_summary_cache(cache)
+    title, report_md, date_str = build_report(posts_data, summaries)
+
+    os.makedirs("reports", exist_ok=True)
+    report_path = f"reports/{date_str}.md"
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(report_md)
+
+    print(f"Report generated at {report_path}")
+
+    # ---- Email delivery (optional) ----
+    if GMAIL_USER and GMAIL_APP_PASSWORD and TO_EMAIL:
+        try:
+            send_email(title, report_md, TO_EMAIL)
+            print("Email sent.")
+        except Exception as e:
+            print("Email failed:", e)
+    else:
+        print("Email not configured; skipping email send.")
+
+    # ---- Notion delivery (optional) ----
+    if NOTION_TOKEN and NOTION_PAGE_ID:
+        try:
+            push_notion(title, report_md)
+        except Exception as e:
+            print("Notion push failed:", e)
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,167 @@
 import os
+import resource
+import sys
+import time
 from datetime import datetime
-from src.scrape import fetch_new_posts
-from src.analyze import analyze_item
-from src.digest import build_markdown_digest, build_html_digest
-from src.send_email import send_email
-from src.ics import build_ics, build_per_event_ics, build_invite_blocks
-from src.utils import load_json
-from src.config import SEEN_POSTS_PATH, GMAIL_ADDRESS, RECIPIENT_EMAIL
-
-try:
-    from src.notion_push import push_to_notion
-except Exception:
-    def push_to_notion(*args, **kwargs): return
+from src.scrape import fetch_new_posts, iter_new_posts
+from src.analyze import ANALYZER_VERSION, analyze_items
+from src.analysis_cache import AnalysisCache
+from src.dedupe import NearDupIndex, group_near_duplicates
+from src.digest import build_markdown_digest, build_html_digest, items_frame
+from src.send_email import INVITE_ATTENDEE, email_enabled, queue_email
+from src.outbox import Outbox
+from src.notion_push import sync_to_notion
+from src.ics import CalendarBuilder, build_calendars, build_invite_blocks
+from src.seen_store import SeenStore
+from src.feed import update_feed
+from src.event_store import sync_event_files
+from src.utils import save_date_memo
+from src.sources import make_source
+from src.config import GMAIL_ADDRESS, TZ
 
 ACCOUNTS_FILE = os.path.join(os.path.dirname(__file__), "accounts.txt")
 
-def run():
-    seen_before = load_json(SEEN_POSTS_PATH, default={})
-    print(f"[RUN] Seen before: {len(seen_before)} entries")
+# Streaming: analyze and build invites as each account finishes scraping instead of after all of them
+STREAM_PIPELINE = os.getenv("STREAM_PIPELINE", "0") == "1"
+# Reuse earlier analyses of the same caption text (.cache/analysis.sqlite3)
+ANALYSIS_CACHE = os.getenv("ANALYSIS_CACHE", "1") == "1"
 
-    print("[RUN] Fetching posts…")
-    raw_items, meta = fetch_new_posts(ACCOUNTS_FILE)
-    rate_limited = meta.get("rate_limited", False)
-    print(f"[RUN] Raw items fetched: {len(raw_items)} | rate_limited={rate_limited}")
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
+
+def _staged(source, organizer: str, attendee: str, cache):
+    """Each stage runs over the complete list produced by the previous one."""
+    started = time.monotonic()
+    raw_items, meta = fetch_new_posts(ACCOUNTS_FILE, source=source)
+    print(f"[RUN] Raw items fetched: {len(raw_items)} | rate_limited={meta.get('rate_limited', False)}")
+
+    raw_items = group_near_duplicates(raw_items)  # one item per cross-posted caption
 
     print("[RUN] Analyzing items…")
-    analyzed = [analyze_item(it) for it in raw_items]
+    analyzed = analyze_items(raw_items, cache=cache)  # process pool for big batches (ANALYZE_WORKERS)
+    first_s = time.monotonic() - started if analyzed else None
+
+    # One pass for the inline calendar invites (Gmail/Apple-native; Organizer = the sender address,
+    # Attendee = each recipient), the combined .ics attachment (a handy backup) and the VEVENTs
+    # the feed and event files reuse (rendered in TZ, the zone their VTIMEZONE describes)
+    cals = build_calendars(analyzed, organizer_email=organizer, attendee_email=attendee, tz=TZ, per_event=False)
+    return analyzed, cals["invites"], cals["combined"], cals["vevents"], meta, first_s
+
+def _streaming(source, organizer: str, attendee: str, cache):
+    """
+    Items flow scrape → analyze → ICS one at a time; only the analyzed list is kept (for the digest).
+    Always serial: forking a process pool while the scrape threads are running isn't safe.
+    """
+    started = time.monotonic()
+    meta = {}
+    analyzed, invites, vevents = [], [], []
+    cal = CalendarBuilder(tz=TZ)
+    dupes = NearDupIndex()
+    first_s = None
+    for raw in iter_new_posts(ACCOUNTS_FILE, source=source, meta=meta):
+        # A cross-post only adds its account to the canonical item; analyze_items copies the
+        # item shallowly, so the analyzed item shares that "accounts" list and sees it too
+        if dupes.add(raw) is not None:
+            continue
+        it = analyze_items([raw], cache=cache)[0]
+        if first_s is None:
+            first_s = time.monotonic() - started
+        analyzed.append(it)
+        invites.extend(build_invite_blocks([it], organizer_email=organizer, attendee_email=attendee, tz_name=TZ))
+        vevents.append(cal.add(it))
+    if dupes.merged:
+        print(f"[DEDUPE] Folded {dupes.merged} cross-posted copies into {len(analyzed)} items")
+    print(f"[RUN] Streamed items: {len(analyzed)} | rate_limited={meta.get('rate_limited', False)}")
+    return analyzed, invites, cal.build(), vevents, meta, first_s
+
+def run(source=None, deliver=True):
+    """
+    `source` overrides POST_SOURCE (see src/sources.py). deliver=False (--dry-run) skips email and
+    Notion and persists nothing: seen, watermark, retry and profile state are read but not written
+    back, so the run previews what a real one would fetch, and the feed and event files are left alone.
+    """
+    source = source or make_source(persist_state=deliver)
+    persist = source.persist_state and deliver
+    seen_before = None
+    if persist:
+        with SeenStore() as seen:
+            seen_before = len(seen)
+        print(f"[RUN] Seen before: {seen_before} entries")
+
+    # Mail left in the outbox by earlier runs goes out ahead of today's, in the same drain. That
+    # drain's SMTP threads only start after analysis: _staged may fork a process pool.
+    outbox = Outbox() if deliver and email_enabled() else None
+    if outbox is not None and len(outbox):
+        print(f"[RUN] Outbox: {len(outbox)} unsent message(s) from earlier runs")
+
+    print("[RUN] Fetching posts…" + (" (streaming)" if STREAM_PIPELINE else ""))
+    organizer = GMAIL_ADDRESS or "no-reply@example.com"
+    attendee = INVITE_ATTENDEE  # send_email addresses each recipient's copy of the invites
+    stages = _streaming if STREAM_PIPELINE else _staged
+    cache = AnalysisCache(ANALYZER_VERSION) if ANALYSIS_CACHE else None
+    try:
+        analyzed, invites, (combo_name, combo_bytes), vevents, meta, first_s = stages(source, organizer, attendee, cache)
+    finally:
+        if cache:
+            cache.close()
+    save_date_memo()
     print(f"[RUN] Analyzed items: {len(analyzed)}")
+    if first_s is not None:
+        print(f"[RUN] First analyzed item after {first_s:.2f}s")
+    print(f"[RUN] Peak RSS so far: {_peak_rss_mb():.1f} MB")
 
-    # Build inline calendar invites (Gmail/Apple-native)
-    # Organizer = the sender address; Attendee = you (recipient)
-    invites = build_invite_blocks(analyzed, organizer_email=GMAIL_ADDRESS or "no-reply@example.com", attendee_email=RECIPIENT_EMAIL or "you@example.com")
+    if persist:  # dry runs and replays (bench.py) leave the committed feed and event files alone
+        update_feed(analyzed, vevents=vevents)
+        sync_event_files(analyzed, vevents=vevents)
 
-    # Optional: also attach a combined .ics as backup (not required, but handy)
     attachments = []
-    combo_name, combo_bytes = build_ics(analyzed)
     if combo_name and combo_bytes:
         attachments.append((combo_name, combo_bytes, "text/calendar"))
 
-    seen_after = load_json(SEEN_POSTS_PATH, default={})
-    print(f"[RUN] Seen after: {len(seen_after)} entries (+{len(seen_after) - len(seen_before)})")
+    if seen_before is not None:
+        with SeenStore() as seen:
+            seen_after = len(seen)
+        print(f"[RUN] Seen after: {seen_after} entries ({seen_after - seen_before:+d}, net of evictions)")
 
-    note = "Instagram rate-limited some accounts this run; results may be partial." if rate_limited else None
+    note = None
+    partial = meta.get("partial", [])
+    skipped = meta.get("skipped", [])
+    if partial or skipped:
+        parts = []
+        if partial:
+            parts.append("Instagram fetch failed for " + ", ".join(f"@{u}" for u in partial) + "; results for these may be partial")
+        if skipped:
+            parts.append("paused after repeated failures: " + ", ".join(f"@{u}" for u in skipped))
+        note = "; ".join(parts) + "."
 
     print("[RUN] Building digest…")
-    md = build_markdown_digest(analyzed, note=note)
-    html = build_html_digest(analyzed, note=note)
+    frame = items_frame(analyzed)  # sort keys and buckets computed once, column-wise, for both digests
+    md = build_markdown_digest(frame, note=note)
+    html = build_html_digest(frame, note=note)
     today = datetime.utcnow().strftime("%Y-%m-%d")
 
-    print("[RUN] Sending email…")
-    send_email(
+    if not deliver:
+        print("[RUN] Done (delivery skipped).")
+        return
+
+    print("[RUN] Queuing email…")
+    queue_email(
         subject=f"Jarvis Brief — {today}",
         html_body=html,
         text_body=md,
         attachments=attachments,
-        invites=invites
+        invites=invites,
+        outbox=outbox,
     )
+    # Sent in the background with retries; whatever is still failing at exit stays spooled for next run
+    drainer = outbox.drain_in_background() if outbox is not None else None
+
+    sync_to_notion(analyzed)
 
-    for it in analyzed:
-        push_to_notion(it)
+    if drainer is not None:
+        drainer.join()
 
     print("[RUN] Done.")
 
 if __name__ == "__main__":
-    run()
+    run(deliver="--dry-run" not in sys.argv[1:])  # --dry-run: everything up to the digest, nothing sent
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .utils import squeeze_ws
+from .config import ANALYSIS_CACHE_PATH
+
+def cache_key(item: Dict, version: str, ref_date: str) -> str:
+    """Normalized caption + account + analyzer version + the local date relative dates resolve against."""
+    caption = squeeze_ws(item.get("caption", "") or "")
+    raw = "\0".join([version, ref_date, item.get("account", ""), caption])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    What analyze_item derived from a caption (summary, importance, event fields), keyed by
+    content rather than shortcode, so reposts and edits back to an earlier text skip the
+    dateparser/regex work. Entries are bucketed by local date ("tomorrow" means something
+    else the next day), so rows from earlier days or another ANALYZER_VERSION are dead:
+    they're dropped on open, and rows unused for a while go with them.
+    """
+
+    def __init__(self, version: str, path: str = ANALYSIS_CACHE_PATH, max_idle_days: float = 2):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.version = version
+        self.ref_date = datetime.now().date().isoformat()
+        self.hits = self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA auto_vacuum=FULL")  # only takes effect on a fresh file
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            " key TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " ref_date TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " used_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        with self._db:
+            cur = self._db.execute(
+                "DELETE FROM analysis WHERE version != ? OR ref_date != ? OR used_at < ?",
+                (version, self.ref_date, time.time() - max_idle_days * 86400),
+            )
+        if cur.rowcount:
+            print(f"[ANALYZE] Cache: evicted {cur.rowcount} stale entries")
+
+    def get_many(self, items: List[Dict]) -> List[Optional[Dict]]:
+        """Cached derived fields per item (None on a miss), in input order."""
+        keys = [cache_key(it, self.version, self.ref_date) for it in items]
+        found: Dict[str, Dict] = {}
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, result in self._db.execute(f"SELECT key, result FROM analysis WHERE key IN ({marks})", chunk):
+                found[key] = json.loads(result)
+        if found:
+            self._db.executemany("UPDATE analysis SET used_at = ? WHERE key = ?",
+                                 ((time.time(), k) for k in found))
+        out = [found.get(k) for k in keys]
+        self.hits += len(items) - out.count(None)
+        self.misses += out.count(None)
+        return out
+
+    def put_many(self, pairs: List[tuple]):
+        """(raw item, analyzed item) pairs; stores only what analysis added to the item. Staged until close()."""
+        now = time.time()
+        rows = []
+        for item, analyzed in pairs:
+            derived = {k: v for k, v in analyzed.items() if k not in item}
+            rows.append((cache_key(item, self.version, self.ref_date), self.version, self.ref_date,
+                         json.dumps(derived, ensure_ascii=False), now))
+        self._db.executemany("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        if self.hits or self.misses:
+            print(f"[ANALYZE] Cache: {self.hits} hits, {self.misses} misses")
+        self._db.commit()  # one transaction per run: streaming mode looks items up one at a time
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,19 +1,20 @@
+import os
 import re
 from datetime import timedelta
-from typing import Dict, Optional
-from .utils import strip_emojis, squeeze_ws, truncate, find_dates, nearest_future
-
-# Importance signals
-CRITICAL = [
-    "deadline", "register", "registration", "apply", "application",
-    "closes", "last day", "final day", "spots left", "limited spots", "rsvp",
-    "today only", "ends today", "tickets"
-]
-TIMEY = [
-    "event", "workshop", "seminar", "webinar", "orientation", "meeting",
-    "tonight", "this week", "tomorrow", "today", "info session",
-    "career fair", "case competition", "boat cruise", "tryouts", "auditions",
-]
+from typing import Dict, List, Tuple
+from .utils import (strip_emojis, squeeze_ws, truncate, find_dates, find_dates_cached, nearest_future,
+                    take_date_memo_updates, merge_date_memo)
+from .keywords import ENGINE, CRITICAL, TIMEY, categories, keywords_in  # noqa: F401 (lists re-exported)
+
+# Importance/CTA keyword lists live in keywords.py; each caption is scanned for them once (CaptionDoc.kw_hits).
+
+# Bump whenever analyze_item's output changes for the same caption; invalidates the analysis cache
+ANALYZER_VERSION = "1"
+
+# Process-pool analysis (analyze_items): worker count (0 = one per CPU) and the batch size
+# below which the serial path is used, since starting workers costs more than it saves
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "0")) or (os.cpu_count() or 1)
+ANALYZE_MIN_BATCH = int(os.getenv("ANALYZE_MIN_BATCH", "200"))
 
 # Patterns we’ll detect
 TIME_PAT = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s?(am|pm)\b", re.I)
@@ -36,18 +37,16 @@ def _clean_caption(caption: str) -> str:
     cap = squeeze_ws(cap)
     return cap
 
-def classify_importance(text: str) -> str:
-    low = (text or "").lower()
-    if any(k in low for k in CRITICAL):
+def classify_importance(text: str, kw_hits=None) -> str:
+    cats = categories(ENGINE.scan(text) if kw_hits is None else kw_hits)
+    if "critical" in cats:
         return "Critical"
-    if any(k in low for k in TIMEY):
+    if "timey" in cats:
         return "Time-Sensitive"
     return "FYI"
 
-def _parse_time_to_hm(text: str) -> Optional[tuple]:
-    m = TIME_PAT.search(text or "")
-    if not m:
-        return None
+def _hm(m) -> tuple:
+    """(hour, minute) in 24h from a TIME_PAT match."""
     hour = int(m.group(1))
     minute = int(m.group(2) or 0)
     ampm = (m.group(3) or "").lower()
@@ -57,18 +56,81 @@ def _parse_time_to_hm(text: str) -> Optional[tuple]:
         hour = 0
     return hour, minute
 
-def _best_sentences(cap: str, max_chars: int = 360) -> str:
-    parts = [p.strip() for p in SENT_SPLIT.split(cap) if p.strip()]
-    if not parts:
+def _sentence_spans(cap: str) -> List[Tuple[int, int, str]]:
+    """(start, end, text) for each stripped, non-empty SENT_SPLIT piece of `cap`."""
+    spans = []
+    pos = 0
+    for sep in list(SENT_SPLIT.finditer(cap)) + [None]:
+        end = sep.start() if sep else len(cap)
+        piece = cap[pos:end]
+        text = piece.strip()
+        if text:
+            start = pos + (len(piece) - len(piece.lstrip()))
+            spans.append((start, start + len(text), text))
+        if sep:
+            pos = sep.end()
+    return spans
+
+def _date_offsets(cap: str, date_hits) -> List[int]:
+    """Start offsets in `cap` of the fragments find_dates returned (they come back in text order)."""
+    offsets = []
+    pos = 0
+    for frag, _ in date_hits:
+        i = cap.find(frag, pos)
+        if i < 0:
+            i = cap.find(frag)
+        if i >= 0:
+            offsets.append(i)
+            pos = i + len(frag)
+    return offsets
+
+def _first(pat, text: str):
+    """(start, end, matched text) of the first match, or None."""
+    m = pat.search(text)
+    return (m.start(), m.end(), m.group(0)) if m else None
+
+class CaptionDoc:
+    """
+    A caption parsed once: the cleaned text, its sentence spans, and every hit the analyzers
+    read, with offsets into `text`. Built by parse_caption(); the scorers and field extractors
+    only look things up here instead of re-cleaning and re-searching the caption.
+    """
+    __slots__ = ("text", "spans", "kw_hits", "kw_offsets_ok", "date_hits", "date_offsets",
+                 "times", "venue", "money", "email", "url", "link_in_bio", "title_hint")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.spans = _sentence_spans(text)
+        # Keyword hits are offsets into text.lower(); per-sentence lookups by offset only work
+        # when lowercasing kept the length (it can grow, e.g. "İ")
+        self.kw_hits = ENGINE.scan(text)
+        self.kw_offsets_ok = len(text.lower()) == len(text)
+        self.date_hits = find_dates_cached(text)
+        self.date_offsets = _date_offsets(text, self.date_hits)
+        self.times = tuple((m.start(), m.end(), _hm(m)) for m in TIME_PAT.finditer(text))
+        self.venue = _first(VENUE_PAT, text)
+        self.money = _first(MONEY_PAT, text)
+        self.email = _first(EMAIL_PAT, text)
+        self.url = _first(URL_PAT, text)
+        self.link_in_bio = URL_IN_BIO_PAT.search(text) is not None
+        hint = TITLE_HINT_PAT.search(text)
+        self.title_hint = hint.group(1) if hint else None
+
+def parse_caption(caption: str) -> CaptionDoc:
+    return CaptionDoc(_clean_caption(caption))
+
+def _best_sentences(doc: CaptionDoc, max_chars: int = 360) -> str:
+    if not doc.spans:
         return "(No caption)"
     scored = []
-    for p in parts[:8]:  # scan first few
-        s = 0
-        low = p.lower()
-        for w in ["register", "apply", "rsvp", "join", "sign up", "tickets", "deadline", "limited", "free"]:
-            if w in low: s += 2
-        if find_dates(p): s += 2
-        if TIME_PAT.search(p): s += 1
+    for start, end, p in doc.spans[:8]:  # scan first few
+        if doc.kw_offsets_ok:
+            s = 2 * len(keywords_in(doc.kw_hits, "cta", start, end))
+        else:
+            s = 2 * len(keywords_in(ENGINE.scan(p), "cta"))
+        # A sentence "has a date" if a hit from the one whole-caption search starts inside it
+        if any(start <= o < end for o in doc.date_offsets): s += 2
+        if any(start <= t < end for t, _, _ in doc.times): s += 1
         scored.append((s, p))
     scored.sort(reverse=True, key=lambda x: (x[0], -len(x[1])))
     take = []
@@ -79,48 +141,44 @@ def _best_sentences(cap: str, max_chars: int = 360) -> str:
             seen.add(sent)
         if len(take) == 2:
             break
-    return truncate(" ".join(take) if take else parts[0], max_chars)
+    return truncate(" ".join(take) if take else doc.spans[0][2], max_chars)
 
-def _event_title(account: str, caption: str, date_str: str, time_str: str) -> str:
+def _event_title(account: str, doc: CaptionDoc, date_str: str, time_str: str) -> str:
     """Hyper-specific title: '@Account — <Hint> (Mon DD, HH:MM)'"""
-    hint = ""
-    m = TITLE_HINT_PAT.search(caption or "")
-    if m:
-        hint = m.group(1).title()
+    if doc.title_hint:
+        hint = doc.title_hint.title()
     else:
-        words = _clean_caption(caption).split()
-        hint = " ".join(words[:5]).strip().rstrip(",.:;") or "Event"
+        hint = " ".join(doc.text.split()[:5]).strip().rstrip(",.:;") or "Event"
         hint = hint.title()
     when = date_str or ""
     if time_str:
         when = f"{when}, {time_str}" if when else time_str
     return f"@{account} — {hint}" + (f" ({when})" if when else "")
 
-def extract_event_fields(caption: str, account: str):
-    cap = _clean_caption(caption)
+def extract_event_fields(caption: str, account: str, doc: CaptionDoc | None = None):
+    """Pass the CaptionDoc already parsed from `caption` to skip parsing it again."""
+    if doc is None:
+        doc = parse_caption(caption)
+
     # Dates
-    date_hits = find_dates(cap)
-    date_obj = nearest_future(date_hits) if date_hits else None
+    date_obj = nearest_future(doc.date_hits) if doc.date_hits else None
     date_hint = date_obj.strftime("%b %d") if date_obj else ""
 
     # Time
-    hm = _parse_time_to_hm(cap)
+    hm = doc.times[0][2] if doc.times else None
     time_hint = f"{hm[0]:02d}:{hm[1]:02d}" if hm else ""
 
     # Venue-ish
-    venue_hit = VENUE_PAT.search(cap)
-    venue_hint = venue_hit.group(0) if venue_hit else ""
+    venue_hint = doc.venue[2] if doc.venue else ""
 
     # Costs / Free
     price_hint = None
-    money = MONEY_PAT.search(cap)
-    if money:
-        price_hint = "Free" if money.group(0).lower().strip() == "free" else money.group(0)
+    if doc.money:
+        price_hint = "Free" if doc.money[2].lower().strip() == "free" else doc.money[2]
 
     # Contact / URLs
-    contact_hint = EMAIL_PAT.search(cap).group(0) if EMAIL_PAT.search(cap) else ""
-    url_found = URL_PAT.search(cap).group(0) if URL_PAT.search(cap) else ""
-    link_bio = bool(URL_IN_BIO_PAT.search(cap))
+    contact_hint = doc.email[2] if doc.email else ""
+    url_found = doc.url[2] if doc.url else ""
 
     # Start/end (for future use or attachments)
     start_dt = end_dt = None
@@ -131,7 +189,7 @@ def extract_event_fields(caption: str, account: str):
             start_dt = date_obj.replace(hour=9, minute=0, second=0, microsecond=0)
         end_dt = start_dt + timedelta(hours=1)
 
-    title = _event_title(account, cap, date_hint, time_hint)
+    title = _event_title(account, doc, date_hint, time_hint)
 
     return {
         "date_hint": date_hint,
@@ -140,22 +198,20 @@ def extract_event_fields(caption: str, account: str):
         "price_hint": price_hint or "",
         "contact_hint": contact_hint,
         "url_found": url_found,
-        "link_in_bio": link_bio,
+        "link_in_bio": doc.link_in_bio,
         "start_fmt": start_dt.strftime("%Y%m%dT%H%M%S") if start_dt else "",
         "end_fmt": end_dt.strftime("%Y%m%dT%H%M%S") if end_dt else "",
         "event_title": title,
     }
 
 def analyze_item(item: Dict) -> Dict:
-    cap = item.get("caption", "") or ""
     account = item.get("account", "")
-    clean_cap = _clean_caption(cap)
-
-    # Importance & summary
-    importance = classify_importance(clean_cap)
-    summary = _best_sentences(clean_cap, max_chars=360)
+    # Clean, split, and run every search (dates, keywords, regexes) once
+    doc = parse_caption(item.get("caption", "") or "")
 
-    fields = extract_event_fields(clean_cap, account)
+    importance = classify_importance(doc.text, kw_hits=doc.kw_hits)
+    summary = _best_sentences(doc, max_chars=360)
+    fields = extract_event_fields(doc.text, account, doc=doc)
 
     return {
         **item,
@@ -163,3 +219,48 @@ def analyze_item(item: Dict) -> Dict:
         "importance": importance,
         **fields,
     }
+
+def _warm_worker():
+    """Pool initializer: pay dateparser's first-call setup (language data, regex compiles) once per worker."""
+    find_dates("Join us tomorrow at 5pm")
+    take_date_memo_updates()  # forked workers inherit the parent's pending entries; it already has those
+
+def _analyze_chunk(chunk: List[Dict]):
+    out = [analyze_item(it) for it in chunk]
+    return out, take_date_memo_updates()
+
+def analyze_items(items: List[Dict], workers: int | None = None, cache=None) -> List[Dict]:
+    """
+    analyze_item over a batch, same results in the same order. With an AnalysisCache
+    (src/analysis_cache.py) only the misses are analyzed, then stored.
+    """
+    if cache is None:
+        return _analyze_all(items, workers)
+    cached = cache.get_many(items)
+    misses = [it for it, hit in zip(items, cached) if hit is None]
+    fresh = iter(_analyze_all(misses, workers))
+    analyzed = [{**it, **hit} if hit is not None else next(fresh) for it, hit in zip(items, cached)]
+    if misses:
+        cache.put_many([(it, out) for it, out, hit in zip(items, analyzed, cached) if hit is None])
+    return analyzed
+
+def _analyze_all(items: List[Dict], workers: int | None = None) -> List[Dict]:
+    """
+    Batches of at least ANALYZE_MIN_BATCH items are spread over a process pool in chunks;
+    date memo entries the workers add are merged back so save_date_memo() still persists them.
+    """
+    workers = ANALYZE_WORKERS if workers is None else workers
+    if workers <= 1 or len(items) < ANALYZE_MIN_BATCH:
+        return [analyze_item(it) for it in items]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    size = max(16, len(items) // (workers * 8))  # ~8 chunks per worker evens out slow captions
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    analyzed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker) as pool:
+        for out, memo in pool.map(_analyze_chunk, chunks):
+            analyzed.extend(out)
+            merge_date_memo(memo)
+    print(f"[ANALYZE] {len(items)} items across {workers} workers ({len(chunks)} chunks)")
+    return analyzed
@@ -5,12 +5,24 @@ TZ = os.getenv("TZ", "America/Toronto")
 GMAIL_ADDRESS = os.getenv("GMAIL_ADDRESS")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 RECIPIENT_EMAIL = os.getenv("RECIPIENT_EMAIL")
+# Digest subscribers, comma-separated; defaults to the single RECIPIENT_EMAIL
+RECIPIENT_EMAILS = [e.strip() for e in (os.getenv("RECIPIENT_EMAILS") or RECIPIENT_EMAIL or "").split(",") if e.strip()]
+
+# Outgoing mail server (defaults: Gmail over implicit TLS). SMTP_AUTH=0 skips login, e.g. for a local relay.
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_AUTH = os.getenv("SMTP_AUTH", "1") == "1"
+SMTP_POOL_SIZE = max(1, int(os.getenv("SMTP_POOL_SIZE", "2")))
+SMTP_DEBUG = os.getenv("SMTP_DEBUG", "0") == "1"  # dump the SMTP exchange to stdout
 
 IG_USERNAME = os.getenv("IG_USERNAME")
 IG_PASSWORD = os.getenv("IG_PASSWORD")
 
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")  # point at a stand-in server for tests
 
 # Calendar UX
 GCAL_AUTHUSER = os.getenv("GCAL_AUTHUSER")  # e.g., your_calendar@gmail.com
@@ -23,14 +35,25 @@ RAW_ICS_BASE = os.getenv("RAW_ICS_BASE")  # optional override; else auto-built
 REPO_DIR = os.path.dirname(__file__)
 REPO_ROOT = os.path.dirname(REPO_DIR)
 REPO_DATA_DIR = os.path.join(REPO_DIR, "data")
-SEEN_POSTS_PATH = os.path.join(REPO_DATA_DIR, "seen_posts.json")
+SEEN_POSTS_PATH = os.path.join(REPO_DATA_DIR, "seen_posts.json")  # legacy; migrated into SEEN_DB_PATH
+SEEN_DB_PATH = os.path.join(REPO_DATA_DIR, "seen_posts.sqlite3")
 LAST_RUN_PATH = os.path.join(REPO_DATA_DIR, "last_run.json")
-
-# Where we'll write per-event ICS files + feed
+RETRY_STATE_PATH = os.path.join(REPO_DATA_DIR, "retry_state.json")
+NOTION_INDEX_PATH = os.path.join(REPO_DATA_DIR, "notion_index.json")  # shortcode -> Notion page id + content hash
+
+# Local, never-committed caches (restored between CI runs by actions/cache)
+CACHE_DIR = os.getenv("JARVIS_CACHE_DIR") or os.path.join(REPO_ROOT, ".cache")
+IG_SESSION_PATH = os.path.join(CACHE_DIR, "ig_session")
+IG_SESSION_MAX_AGE_HOURS = float(os.getenv("IG_SESSION_MAX_AGE_HOURS", "24"))
+PROFILE_CACHE_PATH = os.path.join(CACHE_DIR, "profiles.json")
+DATE_MEMO_PATH = os.path.join(CACHE_DIR, "dates.json")
+ANALYSIS_CACHE_PATH = os.path.join(CACHE_DIR, "analysis.sqlite3")
+SUMMARY_CACHE_PATH = os.path.join(CACHE_DIR, "summaries.json")
+OUTBOX_DIR = os.path.join(CACHE_DIR, "outbox")  # rendered messages not yet accepted by SMTP (src/outbox.py)
+
+# Where we'll write per-event ICS files + feed (writers create them; importing config does no I/O)
 DIST_EVENTS_DIR = os.path.join(REPO_ROOT, "dist", "events")
 DIST_FEED_DIR = os.path.join(REPO_ROOT, "dist", "feed")
-os.makedirs(DIST_EVENTS_DIR, exist_ok=True)
-os.makedirs(DIST_FEED_DIR, exist_ok=True)
 
 def compute_raw_ics_base() -> str | None:
     if RAW_ICS_BASE:
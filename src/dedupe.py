@@ -0,0 +1,104 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+
+from .analyze import TIME_PAT, TITLE_HINT_PAT, _clean_caption, _hm
+from .keywords import ENGINE
+
+# Captions cross-posted by different accounts (umbrella account + sub-accounts) are grouped
+# into one item; an account's own near-identical posts are always kept apart.
+# Two captions are near-duplicates when their 64-bit SimHashes differ in at most
+# DEDUPE_MAX_DISTANCE bits; 0 turns grouping off.
+DEDUPE_MAX_DISTANCE = int(os.getenv("DEDUPE_MAX_DISTANCE", "3"))
+# Captions shorter than this many words are never grouped (too little text to tell apart)
+DEDUPE_MIN_WORDS = int(os.getenv("DEDUPE_MIN_WORDS", "8"))
+
+_WORD = re.compile(r"\w+")
+# Anchors must match exactly: "this Monday" vs "this Thursday" or "seminar" vs "webinar" is a
+# one-word edit SimHash can't see past, but it's a different event. Numbers, weekdays, months
+# and relative days; times (as 24h); the event type (TITLE_HINT_PAT) and event keywords.
+_ANCHOR = re.compile(r"\d+|\b(?:mon|tue|wed|thu|fri|sat|sun|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*", re.I)
+_RELATIVE_DAY = re.compile(r"\b(?:today|tonight|tomorrow|next week|this week|this weekend)\b", re.I)
+_EVENT_CATEGORIES = frozenset({"timey", "tag:Event", "tag:Competition"})
+_BITS = 64
+
+def _anchors(text: str) -> frozenset:
+    words = {m.group(0).lower()[:3] if m.group(0)[0].isalpha() else m.group(0) for m in _ANCHOR.finditer(text)}
+    words |= {m.group(0).lower() for m in _RELATIVE_DAY.finditer(text)}
+    times = {"%02d:%02d" % _hm(m) for m in TIME_PAT.finditer(text)}
+    kinds = {"kind:" + m.group(1).lower() for m in TITLE_HINT_PAT.finditer(text)}
+    events = {"kw:" + h[2] for h in ENGINE.scan(text) if h[3] & _EVENT_CATEGORIES}
+    return frozenset(words | times | kinds | events)
+
+def _entry_anchors(entry: list) -> frozenset:
+    if entry[1] is None:
+        entry[1] = _anchors(entry[3])
+    return entry[1]
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles of `text`; None if it's too short to fingerprint."""
+    words = _WORD.findall(text.lower())
+    if len(words) < DEDUPE_MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+    # Per-bit majority vote, done column-wise over the binary strings
+    bits = [format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+            for s in shingles]
+    half = len(bits) / 2
+    return int("".join("1" if col.count("1") > half else "0" for col in map("".join, zip(*bits))), 2)
+
+class NearDupIndex:
+    """
+    Incremental SimHash index. The fingerprint is cut into DEDUPE_MAX_DISTANCE + 1 bands;
+    two fingerprints within that distance agree on at least one whole band, so each band
+    value is an LSH bucket and only items sharing a bucket are compared.
+    """
+
+    def __init__(self, max_distance: int = DEDUPE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._nbands = max_distance + 1
+        self._width = _BITS // self._nbands
+        self._buckets: List[Dict[int, List[list]]] = [{} for _ in range(self._nbands)]
+        self.merged = 0
+
+    def _bands(self, fp: int):
+        mask = (1 << self._width) - 1
+        return [(fp >> (i * self._width)) & mask for i in range(self._nbands)]
+
+    def add(self, item: Dict) -> Optional[Dict]:
+        """
+        Register `item` as canonical and return None, or, if a near-duplicate from other
+        accounts is already indexed (same anchors), add item's account to that canonical
+        item's "accounts" and return it.
+        Every item passed through here gets an "accounts" list.
+        """
+        account = item.get("account", "")
+        text = _clean_caption(item.get("caption", ""))
+        fp = simhash(text) if self.max_distance > 0 else None
+        # Entries are [fp, anchors, item, text]; anchors are computed on first comparison
+        entry = [fp, None, item, text]
+        if fp is not None:
+            bands = self._bands(fp)
+            for bucket, band in zip(self._buckets, bands):
+                for other in bucket.get(band, ()):
+                    canon = other[2]
+                    if account in canon["accounts"] or bin(fp ^ other[0]).count("1") > self.max_distance:
+                        continue
+                    if _entry_anchors(entry) == _entry_anchors(other):
+                        canon["accounts"].append(account)
+                        self.merged += 1
+                        return canon
+        item["accounts"] = [account]
+        if fp is not None:
+            for bucket, band in zip(self._buckets, bands):
+                bucket.setdefault(band, []).append(entry)
+        return None
+
+def group_near_duplicates(items: List[Dict]) -> List[Dict]:
+    """Canonical items in input order (first copy wins), each with all source "accounts"."""
+    index = NearDupIndex()
+    out = [it for it in items if index.add(it) is None]
+    if index.merged:
+        print(f"[DEDUPE] Folded {index.merged} cross-posted copies into {len(out)} items")
+    return out
@@ -1,5 +1,9 @@
-from typing import List, Dict
-from datetime import datetime, timedelta
+import os
+from typing import Dict, IO, Iterator
+from datetime import datetime
+
+# Digest ordering runs on a pandas frame of the analyzed items (items_frame); pandas is
+# imported on first use so the entry points stay quick to start.
 
 PRIORITY_ORDER = {"Critical": 0, "Time-Sensitive": 1, "FYI": 2}
 
@@ -16,112 +20,128 @@ CSS = """
   .btn { display:inline-block; padding:8px 12px; border-radius:8px; text-decoration:none; background:#0b57d0; color:#fff; font-weight:600; }
 """
 
-def _parse_start_date(it: Dict):
-    sf = it.get("start_fmt", "")
-    if not sf:
-        return None
-    try:
-        return datetime.strptime(sf, "%Y%m%dT%H%M%S")
-    except Exception:
-        return None
-
-def _bucket_label(dt: datetime | None) -> str:
-    if dt is None:
-        return "Upcoming"  # unknown date → bottom group
-    today = datetime.now().date()
-    d = dt.date()
-    if d == today:
-        return "Today"
-    if 0 < (d - today).days <= 7:
-        return "This Week"
-    return "Upcoming"
-
-def _when_line(it: Dict) -> str:
-    datep = it.get("date_hint","")
-    timep = it.get("time_hint","")
-    if datep and timep:
-        return f"{datep} @ {timep}"
-    return datep or timep or "TBD"
-
-def _action_line(it: Dict) -> str:
-    if it.get("url_found"):
-        return f"Use link: {it['url_found']}"
-    if it.get("link_in_bio"):
-        return "Link in bio"
-    return "See post"
-
-def _card_html(it: Dict) -> str:
-    account = it.get("account","")
-    url = it.get("url","#")
-    importance = it.get("importance","FYI")
-    when = _when_line(it)
-    where = it.get("venue_hint","")
-    price = it.get("price_hint","")
-    contact = it.get("contact_hint","")
-    title = it.get("event_title","Event")
-
-    rows = [
-        f"<div class='meta'><span class='k'>What:</span> {title}</div>",
-        f"<div class='meta'><span class='k'>When:</span> {when}</div>",
-    ]
+def items_frame(items):
+    """
+    Analyzed items as a DataFrame holding the digest's sort keys, computed vectorized, plus
+    the item dicts ("item") and their render memo keys ("render_key"):
+      priority (PRIORITY_ORDER, unknown -> 3), start_fmt, account, and bucket (Today /
+      This Week / Upcoming by start date; unknown or past -> Upcoming).
+    Passing a frame back in returns it unchanged.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(items, pd.DataFrame):
+        return items
+    df = pd.DataFrame({
+        "item": pd.Series(items, dtype=object),
+        "importance": [it.get("importance", "FYI") for it in items],
+        # sorted as strings, like before: an empty start_fmt sorts first, a missing one last
+        "start_fmt": [it.get("start_fmt", "99999999999999") for it in items],
+        "account": [it.get("account", "") for it in items],
+        "render_key": pd.Series([_render_key(it) for it in items], dtype=object),
+    })
+    df["priority"] = df["importance"].map(PRIORITY_ORDER).fillna(3).astype(int)
+    start = pd.to_datetime(df["start_fmt"], format="%Y%m%dT%H%M%S", errors="coerce")
+    days = (start.dt.normalize() - pd.Timestamp(datetime.now().date())).dt.days
+    df["bucket"] = np.select([days == 0, (days > 0) & (days <= 7)], ["Today", "This Week"], "Upcoming")
+    return df
+
+# Rendered cards and markdown lines are memoized by item content, so re-rendering the same
+# items (another recipient, a resend, a regenerate after a failure) only formats new ones.
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "100000"))
+_CARD_MEMO: Dict[tuple, str] = {}
+_MD_MEMO: Dict[tuple, str] = {}
+
+# What a card or markdown line shows; a missing (or None) value renders as the default
+_RENDER_FIELDS = ("account", "url", "importance", "event_title", "date_hint", "time_hint", "venue_hint",
+                  "price_hint", "contact_hint", "url_found", "link_in_bio", "summary")
+
+def _render_key(it: Dict) -> tuple:
+    """Hashable content of an item's card/line: the memo key."""
+    accounts = it.get("accounts")
+    return (tuple(accounts) if accounts else None, *map(it.get, _RENDER_FIELDS))
+
+def _render(key: tuple) -> tuple:
+    """(card html, markdown line) for a render key. The layout is a pair of f-strings, compiled with the module."""
+    accounts, account, url, importance, title, datep, timep, where, price, contact, url_found, link_in_bio, summary = key
+    url = "#" if url is None else url
+    importance = "FYI" if importance is None else importance
+    title = "Event" if title is None else title
+    # '@a' or, for a cross-posted caption folded by dedupe.py, '@a · @b · @c'
+    who = " · ".join(f"@{a}" for a in accounts) if accounts else f"@{account or ''}"
+    when = f"{datep} @ {timep}" if datep and timep else (datep or timep or "TBD")
+    action = f"Use link: {url_found}" if url_found else ("Link in bio" if link_in_bio else "See post")
+
+    rows = f"<div class='meta'><span class='k'>What:</span> {title}</div> <div class='meta'><span class='k'>When:</span> {when}</div>"
     if where:
-        rows.append(f"<div class='meta'><span class='k'>Where:</span> {where.title()}</div>")
+        rows += f" <div class='meta'><span class='k'>Where:</span> {where.title()}</div>"
     if price:
-        rows.append(f"<div class='meta'><span class='k'>Cost:</span> {price}</div>")
-    action = _action_line(it)
-    rows.append(f"<div class='meta'><span class='k'>Action:</span> {action}</div>")
+        rows += f" <div class='meta'><span class='k'>Cost:</span> {price}</div>"
+    rows += f" <div class='meta'><span class='k'>Action:</span> {action}</div>"
     if contact:
-        rows.append(f"<div class='meta'><span class='k'>Contact:</span> {contact}</div>")
+        rows += f" <div class='meta'><span class='k'>Contact:</span> {contact}</div>"
 
-    return f"""
+    card = f"""
       <div class="card">
-        <div class="account">@{account} <span class="pill">{importance}</span></div>
-        {' '.join(rows)}
-        <div class="sum">{it.get('summary','')}</div>
+        <div class="account">{who} <span class="pill">{importance}</span></div>
+        {rows}
+        <div class="sum">{"" if summary is None else summary}</div>
         <a class="btn" href="{url}">Open Post</a>
       </div>
     """
+    return card, f"- {who} [{importance}] {title} — {when} — {url}"
+
+def _rendered(key: tuple, memo: Dict[tuple, str], which: int) -> str:
+    out = memo.get(key)
+    if out is None:
+        if len(_CARD_MEMO) >= RENDER_CACHE_SIZE:
+            _CARD_MEMO.clear()
+            _MD_MEMO.clear()
+        _CARD_MEMO[key], _MD_MEMO[key] = rendered = _render(key)
+        out = rendered[which]
+    return out
 
-def build_markdown_digest(items: List[Dict], note: str | None = None) -> str:
+def build_markdown_digest(items, note: str | None = None) -> str:
+    """`items`: list of analyzed dicts or an items_frame()."""
     # Plaintext fallback (kept simple)
-    if not items and not note:
+    if not len(items) and not note:
         return "# Jarvis Brief\n\nNo new posts."
     lines = ["# Jarvis Brief\n"]
     if note: lines.append(f"> {note}\n")
-    for it in sorted(items, key=lambda x: (PRIORITY_ORDER.get(x.get("importance","FYI"), 3), x.get("account",""))):
-        when = _when_line(it)
-        lines.append(f"- @{it['account']} [{it['importance']}] {it.get('event_title','Event')} — {when} — {it['url']}")
+    if len(items):
+        df = items_frame(items).sort_values(["priority", "account"], kind="stable")
+        lines.extend(_rendered(key, _MD_MEMO, 1) for key in df["render_key"])
     return "\n".join(lines)
 
-def build_html_digest(items: List[Dict], note: str | None = None) -> str:
-    if not items and not note:
-        return f"<html><head><style>{CSS}</style></head><body><div class='title'>Jarvis Brief</div>No new posts.</body></html>"
+def iter_html_digest(items, note: str | None = None, chunk_cards: int = 256) -> Iterator[str]:
+    """The HTML digest as a stream of chunks (at most `chunk_cards` cards each)."""
+    if not len(items) and not note:
+        yield f"<html><head><style>{CSS}</style></head><body><div class='title'>Jarvis Brief</div>No new posts.</body></html>"
+        return
 
-    # Group into Today / This Week / Upcoming by start date (unknown → Upcoming)
-    buckets = {"Today": [], "This Week": [], "Upcoming": []}
-    for it in items:
-        buckets[_bucket_label(_parse_start_date(it))].append(it)
-
-    html = [f"<html><head><style>{CSS}</style></head><body>"]
-    html.append("<div class='title'>Jarvis Brief</div>")
+    head = f"<html><head><style>{CSS}</style></head><body><div class='title'>Jarvis Brief</div>"
     if note:
-        html.append(f"<div class='section' style='text-transform:none;color:#334155;background:#f1f5f9;padding:8px;border-radius:8px'>{note}</div>")
-
-    # Within each section, sort by (priority, date, account)
-    for section in ["Today", "This Week", "Upcoming"]:
-        group = buckets[section]
-        if not group: continue
-        html.append(f"<div class='section'>{section}</div>")
-        group_sorted = sorted(
-            group,
-            key=lambda x: (
-                PRIORITY_ORDER.get(x.get("importance","FYI"), 3),
-                x.get("start_fmt","99999999999999"),
-                x.get("account",""),
-            )
-        )
-        for it in group_sorted:
-            html.append(_card_html(it))
-
-    html.append("</body></html>")
-    return "".join(html)
+        head += f"<div class='section' style='text-transform:none;color:#334155;background:#f1f5f9;padding:8px;border-radius:8px'>{note}</div>"
+    yield head
+
+    # Group into Today / This Week / Upcoming by start date (unknown → Upcoming),
+    # then within each section sort by (priority, date, account)
+    if len(items):
+        df = items_frame(items).sort_values(["priority", "start_fmt", "account"], kind="stable")
+        for section in ["Today", "This Week", "Upcoming"]:
+            group = df["render_key"][df["bucket"] == section].tolist()
+            if not group: continue
+            yield f"<div class='section'>{section}</div>"
+            for i in range(0, len(group), chunk_cards):
+                yield "".join(_rendered(key, _CARD_MEMO, 0) for key in group[i:i + chunk_cards])
+
+    yield "</body></html>"
+
+def build_html_digest(items, note: str | None = None) -> str:
+    """`items`: list of analyzed dicts or an items_frame()."""
+    return "".join(iter_html_digest(items, note))
+
+def write_html_digest(items, fp: IO[str], note: str | None = None) -> int:
+    """Stream the HTML digest into a text file object without building it in memory; returns chars written."""
+    return sum(fp.write(chunk) for chunk in iter_html_digest(items, note))
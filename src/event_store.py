@@ -0,0 +1,110 @@
+import glob
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from pytz import timezone
+
+from .config import DIST_EVENTS_DIR, TZ
+from .ics import IcsWriter, semantic_hash, unfold, vevent_text, vevent_uid
+from .utils import load_json, save_json
+
+# Per-event .ics files (dist/events/event-<shortcode>.ics) are deleted EVENTS_GRACE_DAYS after the event ends
+EVENTS_GRACE_DAYS = float(os.getenv("EVENTS_GRACE_DAYS", "7"))
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _dtend(vevent: str) -> str:
+    """Local 'YYYYMMDDTHHMMSS' of DTEND (the TZID form _vevent writes)."""
+    for line in unfold(vevent).splitlines():
+        if line.startswith("DTEND"):
+            return line.rsplit(":", 1)[1].rstrip("Z")
+    return ""
+
+class EventStore:
+    """
+    dist/events/event-<shortcode>.ics, one calendar per event, plus a manifest
+    (dist/events/manifest.json): {uid: {"file": name, "hash": semantic hash, "end": fmt}}.
+    A file is (re)written only when its event's content changed, DTSTAMP aside, so regenerating
+    an unchanged event leaves the committed bytes alone; prune() deletes the files of events
+    that ended more than grace_days ago. Files from before the manifest are adopted on open.
+    """
+
+    def __init__(self, path: str = DIST_EVENTS_DIR, tz: str = TZ, grace_days: float = EVENTS_GRACE_DAYS):
+        self.dir = path
+        self.tz = tz
+        self.grace_days = grace_days
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self.events: Dict[str, Dict] = load_json(self.manifest_path, default={})
+        self.writer = IcsWriter(tz)
+        self.written = self.pruned = 0
+        self._dirty = False
+        self._adopt_untracked()
+
+    def _adopt_untracked(self):
+        tracked = {ev["file"] for ev in self.events.values()}
+        for path in glob.glob(os.path.join(self.dir, "event-*.ics")):
+            name = os.path.basename(path)
+            if name in tracked:
+                continue
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                ve = vevent_text(f.read())  # hashed like put() hashes the VEVENT it renders
+            uid = vevent_uid(ve)
+            if uid:
+                self.events[uid] = {"file": name, "hash": semantic_hash(ve), "end": _dtend(ve)}
+                self._dirty = True
+
+    def put(self, it: Dict, vevent: str | None = None) -> bool:
+        """Write the item's event file if its content changed; returns whether it was written.
+        `vevent`: the item's VEVENT if already rendered (build_calendars)."""
+        if not (it.get("start_fmt") and it.get("end_fmt")):
+            return False
+        ve = self.writer.vevent(it) if vevent is None else vevent
+        if not ve:
+            return False
+        uid, digest = vevent_uid(ve), semantic_hash(ve)
+        name = f"event-{it.get('shortcode','')}.ics"
+        old = self.events.get(uid)
+        if old is not None and old["hash"] == digest and os.path.exists(os.path.join(self.dir, name)):
+            return False
+        os.makedirs(self.dir, exist_ok=True)
+        years = (int(it["start_fmt"][:4]), int(it["end_fmt"][:4]))
+        _write_atomic(os.path.join(self.dir, name), self.writer.calendar([ve], years))
+        self.events[uid] = {"file": name, "hash": digest, "end": it["end_fmt"]}
+        self.written += 1
+        self._dirty = True
+        return True
+
+    def put_many(self, items: List[Dict], vevents: List[str] | None = None) -> int:
+        return sum(self.put(it, None if vevents is None else vevents[i]) for i, it in enumerate(items))
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Delete the files of events that ended more than grace_days ago (end times are local to self.tz)."""
+        now = now or datetime.now(timezone(self.tz)).replace(tzinfo=None)
+        cutoff = (now - timedelta(days=self.grace_days)).strftime("%Y%m%dT%H%M%S")
+        gone = [uid for uid, ev in self.events.items() if ev["end"] < cutoff]
+        for uid in gone:
+            path = os.path.join(self.dir, self.events.pop(uid)["file"])
+            if os.path.exists(path):
+                os.remove(path)
+        self.pruned += len(gone)
+        self._dirty = self._dirty or bool(gone)
+        return len(gone)
+
+    def save(self):
+        if self._dirty:
+            save_json(self.manifest_path, dict(sorted(self.events.items(), key=lambda kv: (kv[1]["end"], kv[0]))))
+            self._dirty = False
+
+def sync_event_files(items: List[Dict], path: str = DIST_EVENTS_DIR, vevents: List[str] | None = None) -> EventStore:
+    """Write changed per-event files for this run's items, prune expired ones, and save the manifest."""
+    store = EventStore(path)
+    store.put_many(items, vevents)
+    store.prune()
+    store.save()
+    print(f"[EVENTS] {len(store.events)} event files ({store.written} written, {store.pruned} pruned)")
+    return store
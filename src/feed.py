@@ -0,0 +1,106 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from pytz import timezone
+
+from .config import DIST_FEED_DIR, TZ, compute_raw_ics_base
+from .ics import CRLF, ICS_FOOTER, IcsWriter, semantic_hash, vtimezone
+from .utils import load_json, save_json
+
+# Rolling subscription feed: dist/feed/jarvis.ics holds every known upcoming event, merged by
+# post shortcode run over run; events are dropped FEED_GRACE_DAYS after they end.
+FEED_GRACE_DAYS = float(os.getenv("FEED_GRACE_DAYS", "7"))
+FEED_NAME = "Jarvis Brief"
+
+FEED_HEADER = CRLF.join(["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Jarvis Brief//EN", "CALSCALE:GREGORIAN",
+                         "METHOD:PUBLISH", f"X-WR-CALNAME:{FEED_NAME}", "X-WR-TIMEZONE:{tz}"]) + CRLF
+
+class Feed:
+    """
+    The subscription feed and its index (dist/feed/index.json):
+      {"feed_sha1": str, "events": {shortcode: {"start": fmt, "end": fmt, "hash": str, "vevent": str}}}
+    start/end are the items' local 'YYYYMMDDTHHMMSS'. merge() only renders this run's items;
+    an event whose content is unchanged keeps its stored VEVENT (and DTSTAMP) byte for byte,
+    and one whose date was corrected replaces its old VEVENT rather than adding a second.
+    save() writes the .ics and the index only when the feed's content changed.
+    """
+
+    def __init__(self, path: str = DIST_FEED_DIR, tz: str = TZ, grace_days: float = FEED_GRACE_DAYS):
+        self.dir = path
+        self.ics_path = os.path.join(path, "jarvis.ics")
+        self.index_path = os.path.join(path, "index.json")
+        self.tz = tz
+        self.grace_days = grace_days
+        index = load_json(self.index_path, default={})
+        self.feed_sha1 = index.get("feed_sha1")
+        self.events: Dict[str, Dict] = index.get("events", {})
+        self.added = self.updated = self.expired = 0
+
+    def merge(self, items: List[Dict], vevents: List[str] | None = None):
+        """`vevents`: the items' VEVENTs if already rendered (build_calendars), "" for undated ones."""
+        writer = IcsWriter(self.tz)
+        for i, it in enumerate(items):
+            if not (it.get("start_fmt") and it.get("end_fmt")):
+                continue
+            ve = vevents[i] if vevents is not None else writer.vevent(it)
+            if not ve:
+                continue
+            key, digest = it.get("shortcode", ""), semantic_hash(ve)
+            old = self.events.get(key)
+            if old is not None and old["hash"] == digest:
+                continue
+            if old is None:
+                self.added += 1
+            else:
+                self.updated += 1
+            self.events[key] = {"start": it["start_fmt"], "end": it["end_fmt"], "hash": digest, "vevent": ve}
+
+    def expire(self, now: datetime | None = None):
+        """Drop events that ended more than grace_days ago (end times are local to self.tz)."""
+        now = now or datetime.now(timezone(self.tz)).replace(tzinfo=None)
+        cutoff = (now - timedelta(days=self.grace_days)).strftime("%Y%m%dT%H%M%S")
+        gone = [key for key, ev in self.events.items() if ev["end"] < cutoff]
+        for key in gone:
+            del self.events[key]
+        self.expired += len(gone)
+
+    def _ordered(self) -> List[Tuple[str, Dict]]:
+        return sorted(self.events.items(), key=lambda kv: (kv[1]["start"], kv[0]))
+
+    def render(self) -> bytes:
+        events = self._ordered()
+        years = [int(ev[k][:4]) for _, ev in events for k in ("start", "end")] or [datetime.now().year]
+        body = "".join(ev["vevent"] for _, ev in events)
+        return (FEED_HEADER.format(tz=self.tz) + vtimezone(self.tz, min(years), max(years)) + body + ICS_FOOTER).encode("utf-8")
+
+    def save(self) -> bool:
+        """Write the feed and index if the feed's content changed; returns whether it did."""
+        if not (self.added or self.updated or self.expired) and os.path.exists(self.ics_path):
+            return False
+        content = self.render()
+        sha1 = hashlib.sha1(content).hexdigest()
+        if sha1 == self.feed_sha1 and os.path.exists(self.ics_path):
+            return False
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self.ics_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, self.ics_path)
+        self.feed_sha1 = sha1
+        save_json(self.index_path, {"feed_sha1": sha1, "events": dict(self._ordered())})
+        return True
+
+def update_feed(items: List[Dict], path: str = DIST_FEED_DIR, vevents: List[str] | None = None) -> Feed:
+    """Merge this run's items into the rolling feed, expire past events, and save if anything changed."""
+    feed = Feed(path)
+    feed.merge(items, vevents)
+    feed.expire()
+    written = feed.save()
+    print(f"[FEED] {len(feed.events)} events (+{feed.added} new, {feed.updated} updated, -{feed.expired} expired); "
+          + ("rewritten" if written else "unchanged"))
+    base = compute_raw_ics_base()
+    if base:
+        print(f"[FEED] Subscribe: {base}/dist/feed/jarvis.ics")
+    return feed
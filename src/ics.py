@@ -1,119 +1,263 @@
+import hashlib
+from bisect import bisect_right
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from pytz import timezone, utc
 from .utils import squeeze_ws
 
-ICS_HEADER = """BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Jarvis Brief//EN
-CALSCALE:GREGORIAN
-METHOD:PUBLISH
-"""
-ICS_FOOTER = "END:VCALENDAR\n"
+# Everything is written the RFC 5545 way: CRLF line endings, content lines folded at 75 octets,
+# and a VTIMEZONE for every TZID that's referenced. IcsWriter renders one batch of items;
+# build_ics / build_per_event_ics / build_invite_blocks (and build_calendars, all three in one
+# pass over the items) are thin wrappers around it.
+
+CRLF = "\r\n"
+
+ICS_HEADER = CRLF.join(["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Jarvis Brief//EN", "CALSCALE:GREGORIAN", "METHOD:PUBLISH"]) + CRLF
+ICS_FOOTER = "END:VCALENDAR" + CRLF
 
 def _escape(s: str) -> str:
     return (s or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
 
-def _vevent(it: Dict, tz="America/Toronto") -> str:
-    start = it.get("start_fmt"); end = it.get("end_fmt")
-    if not (start and end): return ""
-    uid = f"{it.get('shortcode','')}-{start}@jarvis-brief"
-    title = it.get("event_title") or f"@{it.get('account','')} — Instagram event"
-    desc = f"{squeeze_ws(it.get('summary',''))}\n\nPost: {it.get('url','#')}"
-    loc = it.get("venue_hint","")
-    return (
-        "BEGIN:VEVENT\n"
-        f"UID:{_escape(uid)}\n"
-        f"DTSTAMP:{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}\n"
-        f"DTSTART;TZID={tz}:{start}\n"
-        f"DTEND;TZID={tz}:{end}\n"
-        f"SUMMARY:{_escape(title)}\n"
-        f"DESCRIPTION:{_escape(desc)}\n"
-        f"LOCATION:{_escape(loc)}\n"
-        "STATUS:CONFIRMED\n"
-        "TRANSP:OPAQUE\n"
-        "END:VEVENT\n"
-    )
+def fold(line: str) -> str:
+    """A content line folded into chunks of at most 75 octets (continuations start with a space),
+    never splitting a UTF-8 sequence. No trailing CRLF."""
+    if len(line) <= 75 and line.isascii():
+        return line
+    if line.isascii():
+        return (CRLF + " ").join([line[:75]] + [line[i:i + 74] for i in range(75, len(line), 74)])
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    chunks, cur, size, limit = [], [], 0, 75
+    for ch in line:
+        o = ord(ch)
+        n = 1 if o < 0x80 else 2 if o < 0x800 else 3 if o < 0x10000 else 4
+        if size + n > limit:
+            chunks.append("".join(cur))
+            cur, size, limit = [], 0, 74  # the leading space counts
+        cur.append(ch)
+        size += n
+    chunks.append("".join(cur))
+    return (CRLF + " ").join(chunks)
 
-def build_ics(items: List[Dict], tz="America/Toronto") -> Tuple[Optional[str], Optional[bytes]]:
-    events = [ _vevent(it, tz=tz) for it in items if it.get("start_fmt") and it.get("end_fmt") ]
-    events = [e for e in events if e]
-    if not events:
-        return None, None
-    content = ICS_HEADER + "".join(events) + ICS_FOOTER
-    filename = f"jarvis-brief-{datetime.utcnow().strftime('%Y%m%d')}.ics"
-    return filename, content.encode("utf-8")
+def unfold(text: str) -> str:
+    """Undo folding, CRLF or (in hand-edited and older files) bare LF."""
+    return text.replace(CRLF + " ", "").replace("\n ", "")
 
-def build_per_event_ics(items: List[Dict], tz="America/Toronto") -> List[Tuple[str, bytes, str]]:
-    files = []
-    for it in items:
-        if not (it.get("start_fmt") and it.get("end_fmt")):
-            continue
-        ve = _vevent(it, tz=tz)
-        if not ve:
-            continue
-        fname = f"event-{it.get('shortcode','')}.ics"
-        content = ICS_HEADER + ve + ICS_FOOTER
-        files.append((fname, content.encode("utf-8"), it.get("event_title","Event")))
-    return files
+def semantic_hash(vevent: str) -> str:
+    """Hash of a VEVENT's content without DTSTAMP, which changes every time it's generated."""
+    body = "\n".join(line for line in unfold(vevent).splitlines() if not line.startswith("DTSTAMP:"))
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
 
-# ---------- Inline INVITE blocks (METHOD:REQUEST) for Gmail/Apple ----------
-INVITE_HEADER = """BEGIN:VCALENDAR
-PRODID:-//Jarvis Brief//EN
-VERSION:2.0
-CALSCALE:GREGORIAN
-METHOD:REQUEST
-"""
-INVITE_FOOTER = "END:VCALENDAR\n"
+def vevent_text(calendar: str) -> str:
+    """The first VEVENT of a calendar, BEGIN through END, with CRLF line endings like IcsWriter writes it."""
+    lines = calendar.splitlines()
+    try:
+        begin = lines.index("BEGIN:VEVENT")
+        end = lines.index("END:VEVENT", begin)
+    except ValueError:
+        return ""
+    return CRLF.join(lines[begin:end + 1]) + CRLF
+
+def vevent_uid(vevent: str) -> str:
+    for line in unfold(vevent).splitlines():
+        if line.startswith("UID:"):
+            return line[4:]
+    return ""
+
+@lru_cache(maxsize=1024)
+def _organizer_line(email: str) -> str:
+    return fold(f"ORGANIZER:mailto:{email}") + CRLF
 
+@lru_cache(maxsize=1024)
+def attendee_line(email: str) -> str:
+    """The invite ATTENDEE content line, folded and CRLF-terminated (send_email swaps it per recipient)."""
+    return fold(f"ATTENDEE;ROLE=REQ-PARTICIPANT;PARTSTAT=NEEDS-ACTION;RSVP=TRUE:mailto:{email}") + CRLF
+
+@lru_cache(maxsize=None)
+def _tz(tz_name: str):
+    return timezone(tz_name)
+
+@lru_cache(maxsize=65536)
 def _local_fmt_to_utc_z(fmt_str: str, tz_name: str = "America/Toronto") -> str:
     """Convert 'YYYYMMDDTHHMMSS' (local) to UTC 'YYYYMMDDTHHMMSSZ'."""
-    tz = timezone(tz_name)
-    dt_local = tz.localize(datetime.strptime(fmt_str, "%Y%m%dT%H%M%S"))
+    dt_local = _tz(tz_name).localize(datetime.strptime(fmt_str, "%Y%m%dT%H%M%S"))
     dt_utc = dt_local.astimezone(utc)
     return dt_utc.strftime("%Y%m%dT%H%M%SZ")
 
+def _offset(td: timedelta) -> str:
+    minutes = int(td.total_seconds() // 60)
+    sign = "+" if minutes >= 0 else "-"
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+@lru_cache(maxsize=256)
+def vtimezone(tz_name: str, first_year: int, last_year: int) -> str:
+    """
+    VTIMEZONE for tz_name covering first_year..last_year: one observance per transition in that
+    range (from pytz's table), plus the one already in effect on Jan 1 of first_year.
+    """
+    tz = _tz(tz_name)
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{tz_name}"]
+    trans = getattr(tz, "_utc_transition_times", None)
+    info = getattr(tz, "_transition_info", None)
+    if not trans or len(trans) < 2:
+        off = tz.utcoffset(datetime(first_year, 1, 1)) if trans is None else info[0][0]
+        name = tz.tzname(datetime(first_year, 1, 1)) if trans is None else info[0][2]
+        lines += ["BEGIN:STANDARD", "DTSTART:19700101T000000", f"TZOFFSETFROM:{_offset(off)}",
+                  f"TZOFFSETTO:{_offset(off)}", f"TZNAME:{name}", "END:STANDARD"]
+    else:
+        lo = max(1, bisect_right(trans, datetime(first_year, 1, 1)) - 1)
+        hi = max(lo + 1, bisect_right(trans, datetime(last_year + 1, 1, 1)))
+        for i in range(lo, min(hi, len(trans))):
+            off_to, dst, name = info[i]
+            off_from = info[i - 1][0]
+            kind = "DAYLIGHT" if dst else "STANDARD"
+            lines += [f"BEGIN:{kind}", f"DTSTART:{(trans[i] + off_from).strftime('%Y%m%dT%H%M%S')}",
+                      f"TZOFFSETFROM:{_offset(off_from)}", f"TZOFFSETTO:{_offset(off_to)}",
+                      f"TZNAME:{name}", f"END:{kind}"]
+    lines.append("END:VTIMEZONE")
+    return CRLF.join(lines) + CRLF
+
+def _years(items: Iterable[Dict]) -> Tuple[int, int]:
+    years = [int(it[k][:4]) for it in items for k in ("start_fmt", "end_fmt") if it.get(k)]
+    return (min(years), max(years)) if years else (datetime.utcnow().year,) * 2
+
+class IcsWriter:
+    """
+    Renders VEVENTs for one batch: the timezone and each local->UTC conversion are cached,
+    DTSTAMP is taken once, and every content line is folded.
+    """
+
+    def __init__(self, tz: str = "America/Toronto", now: datetime | None = None):
+        self.tz = tz
+        self.dtstamp = (now or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+
+    def _content(self, it: Dict) -> Tuple[str, str, str, str]:
+        """The folded UID, SUMMARY, DESCRIPTION and LOCATION lines (shared by both VEVENT forms)."""
+        uid = f"{it.get('shortcode','')}@jarvis-brief"  # one event per post; no date, so a corrected date updates it
+        title = it.get("event_title") or f"@{it.get('account','')} — Instagram event"
+        desc = f"{squeeze_ws(it.get('summary',''))}\n\nPost: {it.get('url','#')}"
+        loc = it.get("venue_hint","")
+        return (fold(f"UID:{_escape(uid)}"), fold(f"SUMMARY:{_escape(title)}"),
+                fold(f"DESCRIPTION:{_escape(desc)}"), fold(f"LOCATION:{_escape(loc)}"))
+
+    def vevent(self, it: Dict, content: Tuple[str, str, str, str] | None = None) -> str:
+        """The published (METHOD:PUBLISH) form, in local time with TZID; "" without start/end."""
+        start = it.get("start_fmt"); end = it.get("end_fmt")
+        if not (start and end): return ""
+        uid, summary, desc, loc = content or self._content(it)
+        return (
+            f"BEGIN:VEVENT\r\n{uid}\r\nDTSTAMP:{self.dtstamp}\r\n"
+            f"DTSTART;TZID={self.tz}:{start}\r\nDTEND;TZID={self.tz}:{end}\r\n"
+            f"{summary}\r\n{desc}\r\n{loc}\r\n"
+            "STATUS:CONFIRMED\r\nTRANSP:OPAQUE\r\nEND:VEVENT\r\n"
+        )
+
+    def invite_vevent(self, it: Dict, organizer_email: str, attendee_email: str,
+                      content: Tuple[str, str, str, str] | None = None) -> str:
+        """The invite (METHOD:REQUEST) form, in UTC; "" without start/end."""
+        start = it.get("start_fmt"); end = it.get("end_fmt")
+        if not (start and end): return ""
+        uid, summary, desc, loc = content or self._content(it)
+        return (
+            f"BEGIN:VEVENT\r\n{uid}\r\nDTSTAMP:{self.dtstamp}\r\n"
+            f"DTSTART:{_local_fmt_to_utc_z(start, self.tz)}\r\nDTEND:{_local_fmt_to_utc_z(end, self.tz)}\r\n"
+            f"{summary}\r\n{desc}\r\n{loc}\r\n"
+            "STATUS:CONFIRMED\r\nTRANSP:OPAQUE\r\n"
+            f"{_organizer_line(organizer_email)}{attendee_line(attendee_email)}"
+            "SEQUENCE:0\r\nEND:VEVENT\r\n"
+        )
+
+    def calendar(self, vevents: Iterable[str], years: Tuple[int, int]) -> bytes:
+        """A METHOD:PUBLISH calendar of rendered VEVENTs, with the VTIMEZONE they reference."""
+        return "".join([ICS_HEADER, vtimezone(self.tz, *years), *vevents, ICS_FOOTER]).encode("utf-8")
+
+    def invite(self, vevent: str) -> bytes:
+        return (INVITE_HEADER + vevent + INVITE_FOOTER).encode("utf-8")
+
+def _vevent(it: Dict, tz="America/Toronto") -> str:
+    return IcsWriter(tz).vevent(it)
+
+class CalendarBuilder:
+    """Collects VEVENTs one item at a time (streaming runs); build() matches build_ics()."""
+
+    def __init__(self, tz="America/Toronto"):
+        self.tz = tz
+        self.writer = IcsWriter(tz)
+        self.events: List[str] = []
+        self._dated: List[Dict] = []
+
+    def add(self, it: Dict) -> str:
+        """Returns the item's VEVENT ("" if it has no start/end)."""
+        ve = self.writer.vevent(it)
+        if ve:
+            self.events.append(ve)
+            self._dated.append({"start_fmt": it["start_fmt"], "end_fmt": it["end_fmt"]})
+        return ve
+
+    def build(self) -> Tuple[Optional[str], Optional[bytes]]:
+        if not self.events:
+            return None, None
+        filename = f"jarvis-brief-{datetime.utcnow().strftime('%Y%m%d')}.ics"
+        return filename, self.writer.calendar(self.events, _years(self._dated))
+
+def build_calendars(items: List[Dict], organizer_email: str | None = None, attendee_email: str | None = None,
+                    tz="America/Toronto", per_event: bool = True) -> Dict:
+    """
+    One pass over `items` for all the calendar outputs:
+      {"combined": build_ics(...), "per_event": build_per_event_ics(...) (if per_event),
+       "invites": build_invite_blocks(...) (if organizer_email is given),
+       "vevents": each item's published VEVENT, "" if it has no start/end}
+    """
+    writer = IcsWriter(tz)
+    vevents, events, files, invites, dated = [], [], [], [], []
+    for it in items:
+        content = writer._content(it) if it.get("start_fmt") and it.get("end_fmt") else None
+        ve = writer.vevent(it, content)
+        vevents.append(ve)
+        if not ve:
+            continue
+        dated.append(it)
+        events.append(ve)
+        sc = it.get('shortcode','')
+        if per_event:
+            files.append((f"event-{sc}.ics", writer.calendar([ve], _years([it])), it.get("event_title","Event")))
+        if organizer_email is not None:
+            invite = writer.invite_vevent(it, organizer_email, attendee_email, content=content)
+            invites.append((f"invite-{sc}.ics", writer.invite(invite)))
+    combined = (None, None)
+    if events:
+        combined = (f"jarvis-brief-{datetime.utcnow().strftime('%Y%m%d')}.ics", writer.calendar(events, _years(dated)))
+    return {"combined": combined, "per_event": files, "invites": invites, "vevents": vevents}
+
+def build_ics(items: List[Dict], tz="America/Toronto") -> Tuple[Optional[str], Optional[bytes]]:
+    cal = CalendarBuilder(tz=tz)
+    for it in items:
+        cal.add(it)
+    return cal.build()
+
+def build_per_event_ics(items: List[Dict], tz="America/Toronto") -> List[Tuple[str, bytes, str]]:
+    return build_calendars(items, tz=tz)["per_event"]
+
+# ---------- Inline INVITE blocks (METHOD:REQUEST) for Gmail/Apple ----------
+INVITE_HEADER = CRLF.join(["BEGIN:VCALENDAR", "PRODID:-//Jarvis Brief//EN", "VERSION:2.0", "CALSCALE:GREGORIAN", "METHOD:REQUEST"]) + CRLF
+INVITE_FOOTER = "END:VCALENDAR" + CRLF
+
 def _invite_vevent(it: Dict, organizer_email: str, attendee_email: str, tz_name="America/Toronto") -> str:
-    start = it.get("start_fmt"); end = it.get("end_fmt")
-    if not (start and end): return ""
-    uid = f"{it.get('shortcode','')}-{start}@jarvis-brief"
-    title = it.get("event_title") or f"@{it.get('account','')} — Instagram event"
-    desc = f"{squeeze_ws(it.get('summary',''))}\\n\\nPost: {it.get('url','#')}"
-    loc = it.get("venue_hint","")
-    dtstart_z = _local_fmt_to_utc_z(start, tz_name)
-    dtend_z = _local_fmt_to_utc_z(end, tz_name)
-    dtstamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-
-    return (
-        "BEGIN:VEVENT\n"
-        f"UID:{_escape(uid)}\n"
-        f"DTSTAMP:{dtstamp}\n"
-        f"DTSTART:{dtstart_z}\n"
-        f"DTEND:{dtend_z}\n"
-        f"SUMMARY:{_escape(title)}\n"
-        f"DESCRIPTION:{desc}\n"
-        f"LOCATION:{_escape(loc)}\n"
-        "STATUS:CONFIRMED\n"
-        "TRANSP:OPAQUE\n"
-        f"ORGANIZER:mailto:{organizer_email}\n"
-        f"ATTENDEE;ROLE=REQ-PARTICIPANT;PARTSTAT=NEEDS-ACTION;RSVP=TRUE:mailto:{attendee_email}\n"
-        "SEQUENCE:0\n"
-        "END:VEVENT\n"
-    )
+    return IcsWriter(tz_name).invite_vevent(it, organizer_email, attendee_email)
 
 def build_invite_blocks(items: List[Dict], organizer_email: str, attendee_email: str, tz_name="America/Toronto") -> List[Tuple[str, bytes]]:
     """
     Return a list of (filename, bytes) where each bytes is a text/calendar
     iCalendar invite (METHOD:REQUEST) for a single event.
     """
+    writer = IcsWriter(tz_name)
     invites = []
     for it in items:
-        if not (it.get("start_fmt") and it.get("end_fmt")):
-            continue
-        ve = _invite_vevent(it, organizer_email, attendee_email, tz_name)
+        ve = writer.invite_vevent(it, organizer_email, attendee_email)
         if not ve:
             continue
         fname = f"invite-{it.get('shortcode','')}.ics"
-        content = INVITE_HEADER + ve + INVITE_FOOTER
-        invites.append((fname, content.encode("utf-8")))
+        invites.append((fname, writer.invite(ve)))
     return invites
@@ -0,0 +1,107 @@
+import re
+from collections import namedtuple
+from typing import Dict, FrozenSet, List
+
+# Importance signals (analyze.classify_importance)
+CRITICAL = [
+    "deadline", "register", "registration", "apply", "application",
+    "closes", "last day", "final day", "spots left", "limited spots", "rsvp",
+    "today only", "ends today", "tickets"
+]
+TIMEY = [
+    "event", "workshop", "seminar", "webinar", "orientation", "meeting",
+    "tonight", "this week", "tomorrow", "today", "info session",
+    "career fair", "case competition", "boat cruise", "tryouts", "auditions",
+]
+# Call-to-action words that make a sentence summary-worthy (analyze._best_sentences)
+CTA = ["register", "apply", "rsvp", "join", "sign up", "tickets", "deadline", "limited", "free"]
+# Report tags, first match wins (jarvis.reason_tag)
+TAG_RULES = [
+    ("Deadline", ["deadline", "apply", "register", "due", "closes", "last day", "rsvp by"]),
+    ("Event", ["event", "workshop", "seminar", "talk", "webinar", "info session", "orientation", "panel"]),
+    ("Hiring", ["hiring", "recruit", "applications open", "positions", "intern", "apply now", "join our team"]),
+    ("Funding", ["scholarship", "grant", "bursary", "funding"]),
+    ("Competition", ["case competition", "hackathon", "pitch", "moot", "debate"]),
+    ("Academic", ["exam", "midterm", "lecture", "class", "tutorial", "assignment"]),
+    ("Admin", ["closure", "hours", "update", "policy", "procedure"]),
+]
+
+# One keyword occurrence: [start, end) in the lowercased text, plus the keyword's categories.
+# scan() builds plain tuples in this layout (cheaper than namedtuples); Hit documents it.
+Hit = namedtuple("Hit", ["start", "end", "keyword", "categories"])
+
+def _trie_pattern(words: List[str]) -> str:
+    """Alternation built as a trie, so the regex engine walks shared prefixes once and
+    greedy optional tails prefer the longest keyword."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+class KeywordEngine:
+    """
+    Substring matcher for many keyword lists at once: every occurrence of every keyword,
+    overlaps included, with its position and categories. Matching is on the lowercased text,
+    same as `keyword in text.lower()`.
+
+    One regex pass over the text: a zero-width lookahead around the combined (trie-shaped)
+    alternation reports the longest keyword starting at each position. The other keywords
+    starting there are exactly the keywords that are prefixes of it, read from a table.
+    """
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        cats: Dict[str, set] = {}
+        for cat, words in groups.items():
+            for w in words:
+                cats.setdefault(w, set()).add(cat)
+        self.categories = {w: frozenset(c) for w, c in cats.items()}
+        words = sorted(cats, key=len)
+        # keyword -> ((keyword, length, categories), ...) for it and every keyword that is a prefix of it, shortest first
+        self._prefixes = {w: tuple((k, len(k), self.categories[k]) for k in words if w.startswith(k)) for w in words}
+        self._re = re.compile("(?=(" + _trie_pattern(words) + "))")
+
+    def scan(self, text: str) -> List[tuple]:
+        """Every keyword occurrence as a Hit-shaped tuple, sorted by position (then length)."""
+        low = (text or "").lower()
+        hits: List[tuple] = []
+        add = hits.append
+        prefixes = self._prefixes
+        for m in self._re.finditer(low):
+            i = m.start()
+            for k, n, cats in prefixes[m.group(1)]:
+                add((i, i + n, k, cats))
+        return hits
+
+def categories(hits: List[tuple], start: int = 0, end: int | None = None) -> FrozenSet[str]:
+    """Union of categories of hits lying inside [start, end)."""
+    if start == 0 and end is None:
+        return frozenset().union(*(h[3] for h in hits))
+    return frozenset().union(*(h[3] for h in hits if h[0] >= start and (end is None or h[1] <= end)))
+
+def keywords_in(hits: List[tuple], category: str, start: int = 0, end: int | None = None) -> set:
+    """Distinct keywords of `category` found inside [start, end)."""
+    return {h[2] for h in hits if category in h[3] and h[0] >= start and (end is None or h[1] <= end)}
+
+_GROUPS = {"critical": CRITICAL, "timey": TIMEY, "cta": CTA}
+_GROUPS.update({f"tag:{tag}": words for tag, words in TAG_RULES})
+
+# Built once at import; shared by analyze.py and jarvis.py
+ENGINE = KeywordEngine(_GROUPS)
+
+def reason_tag(text: str, hits: List[tuple] | None = None) -> str:
+    cats = categories(ENGINE.scan(text) if hits is None else hits)
+    for tag, _ in TAG_RULES:
+        if f"tag:{tag}" in cats:
+            return tag
+    return "General"
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from .config import NOTION_API_KEY, NOTION_BASE_URL, NOTION_DATABASE_ID, NOTION_INDEX_PATH, TZ
+from .ratelimit import TokenBucket
+from .retry import RETRY_ATTEMPTS, backoff_delay
+from .utils import load_json, save_json
+
+# Notion allows ~3 requests/s per integration; every request from every worker takes a token
+NOTION_REQUESTS_PER_SEC = float(os.getenv("NOTION_REQUESTS_PER_SEC", "3"))
+NOTION_BURST = max(1, int(os.getenv("NOTION_BURST", "3")))
+NOTION_WORKERS = max(1, int(os.getenv("NOTION_WORKERS", "3")))
+
+# API limits: characters per rich-text object, child blocks per request
+TEXT_LIMIT = 2000
+BLOCKS_PER_REQUEST = 100
+
+def _chunks(text: str, limit: int = TEXT_LIMIT) -> List[str]:
+    """`text` cut into pieces of at most `limit` chars, preferring to cut at a newline, then a space."""
+    out = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        out.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        out.append(text)
+    return out
+
+def _text(content: str, link: str | None = None) -> Dict:
+    return {"type": "text", "text": {"content": content, **({"link": {"url": link}} if link else {})}}
+
+def paragraph_blocks(text: str) -> List[Dict]:
+    """Paragraph blocks for `text`, one per TEXT_LIMIT-sized chunk."""
+    return [{"object": "block", "type": "paragraph", "paragraph": {"rich_text": [_text(c)]}} for c in _chunks(text)]
+
+def _bullet(label: str, value: str) -> Dict:
+    return {"object": "block", "type": "bulleted_list_item",
+            "bulleted_list_item": {"rich_text": [_text(f"{label}: "), _text(value[:TEXT_LIMIT])]}}
+
+# Database columns filled in when present, and the property types each may have
+_COLUMN_TYPES = {
+    "Shortcode": ("rich_text",),
+    "Account": ("rich_text", "select"),
+    "Importance": ("select", "rich_text"),
+    "Date": ("date",),
+    "URL": ("url", "rich_text"),
+}
+
+class NotionApi:
+    """
+    notion-client wrapper shared by the sync workers: every request waits on one TokenBucket,
+    and rate-limited (429), server (5xx) and timed-out requests are retried with backoff
+    (Retry-After when Notion sends one).
+    """
+
+    def __init__(self, token: str = NOTION_API_KEY, base_url: str = NOTION_BASE_URL,
+                 rate: float = NOTION_REQUESTS_PER_SEC, burst: int = NOTION_BURST):
+        from notion_client import Client  # deferred: only syncing runs pay for httpx
+
+        self.client = Client(auth=token, base_url=base_url)
+        self.bucket = TokenBucket(rate, burst)
+        self.requests = self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn, **kwargs):
+        from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            self.bucket.acquire()
+            with self._lock:
+                self.requests += 1
+            try:
+                return fn(**kwargs)
+            except (HTTPResponseError, RequestTimeoutError) as e:
+                status = getattr(e, "status", None)
+                if attempt == RETRY_ATTEMPTS or not (status is None or status == 429 or status >= 500):
+                    raise
+                retry_after = getattr(e, "headers", {}).get("retry-after") if status == 429 else None
+                with self._lock:
+                    self.retries += 1
+                time.sleep(float(retry_after) if retry_after else backoff_delay(attempt))
+
+    def append_children(self, block_id: str, children: List[Dict]) -> List[str | None]:
+        """Append in batches; returns the new blocks' ids (None where the response didn't list them)."""
+        ids: List[str | None] = []
+        for i in range(0, len(children), BLOCKS_PER_REQUEST):
+            batch = children[i:i + BLOCKS_PER_REQUEST]
+            res = self.call(self.client.blocks.children.append, block_id=block_id, children=batch)
+            got = [b["id"] for b in (res or {}).get("results", [])][-len(batch):]
+            ids += got if len(got) == len(batch) else [None] * len(batch)
+        return ids
+
+    def create_page(self, parent: Dict, properties: Dict, children: List[Dict]) -> str:
+        """Create a page with any number of child blocks (the first batch rides on the create); returns its id."""
+        page = self.call(self.client.pages.create, parent=parent, properties=properties,
+                         children=children[:BLOCKS_PER_REQUEST])
+        self.append_children(page["id"], children[BLOCKS_PER_REQUEST:])
+        return page["id"]
+
+    def list_children(self, block_id: str) -> List[Dict]:
+        out, cursor = [], None
+        while True:
+            page = self.call(self.client.blocks.children.list, block_id=block_id,
+                             **({"start_cursor": cursor} if cursor else {}))
+            out += page.get("results", [])
+            cursor = page.get("next_cursor")
+            if not page.get("has_more") or not cursor:
+                break
+        return out
+
+class NotionSync:
+    """
+    Upserts analyzed items into a Notion database, one page per post, keyed on shortcode.
+    A local index (src/data/notion_index.json: {shortcode: {"page_id", "hash", "props", "blocks"}})
+    remembers each post's page so it is never created twice, and hashes of what was last
+    written (whole page, properties, each block) so an unchanged item costs no request and a
+    changed one only the requests for what changed. Properties are written only where the database has a
+    column of that name and a compatible type (title, Shortcode, Account, Importance, Date, URL).
+    If the index is lost, it's rebuilt from the database's Shortcode column on first use.
+    """
+
+    def __init__(self, database_id: str = NOTION_DATABASE_ID, api: NotionApi | None = None,
+                 index_path: str | None = NOTION_INDEX_PATH, workers: int = NOTION_WORKERS):
+        self.database_id = database_id
+        self.api = api or NotionApi()
+        self.index_path = index_path
+        self.index: Dict[str, Dict] = load_json(index_path, default={}) if index_path else {}
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._schema: Dict[str, str] | None = None
+        self.stats = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+    def schema(self) -> Dict[str, str]:
+        """Column name -> property type."""
+        if self._schema is None:
+            db = self.api.call(self.api.client.databases.retrieve, database_id=self.database_id)
+            self._schema = {name: prop["type"] for name, prop in db.get("properties", {}).items()}
+        return self._schema
+
+    def _rebuild_index(self):
+        if self.schema().get("Shortcode") != "rich_text":
+            return
+        cursor = None
+        while True:
+            res = self.api.call(self.api.client.databases.query, database_id=self.database_id,
+                                filter={"property": "Shortcode", "rich_text": {"is_not_empty": True}},
+                                **({"start_cursor": cursor} if cursor else {}))
+            for page in res.get("results", []):
+                sc = "".join(t.get("plain_text", "") for t in page["properties"]["Shortcode"].get("rich_text", []))
+                if sc:
+                    self.index.setdefault(sc, {"page_id": page["id"], "hash": None, "props": None, "blocks": None})
+            cursor = res.get("next_cursor")
+            if not res.get("has_more") or not cursor:
+                break
+        print(f"[NOTION] Rebuilt index from the database: {len(self.index)} pages")
+
+    def properties(self, it: Dict) -> Dict:
+        schema = self.schema()
+        accounts = it.get("accounts") or [it.get("account", "")]
+        start = it.get("start_fmt") or ""
+        values = {
+            "Shortcode": it.get("shortcode", ""),
+            "Account": " · ".join(f"@{a}" for a in accounts),
+            "Importance": it.get("importance", "FYI"),
+            "Date": f"{start[:4]}-{start[4:6]}-{start[6:8]}T{start[9:11]}:{start[11:13]}:{start[13:15]}" if start else None,
+            "URL": it.get("url") or None,
+        }
+        props = {}
+        for name, kind in schema.items():
+            if kind == "title":
+                title = it.get("event_title") or f"@{it.get('account', '')}"
+                props[name] = {"title": [_text(title[:TEXT_LIMIT])]}
+                continue
+            value = values.get(name)
+            if value is None or kind not in _COLUMN_TYPES.get(name, ()):
+                continue
+            if kind == "rich_text":
+                props[name] = {"rich_text": [_text(value[:TEXT_LIMIT])]}
+            elif kind == "select":
+                props[name] = {"select": {"name": value.replace(",", " ")[:100]}}  # commas aren't allowed
+            elif kind == "date":
+                props[name] = {"date": {"start": value, "time_zone": TZ}}
+            elif kind == "url":
+                props[name] = {"url": value}
+        return props
+
+    def children(self, it: Dict) -> List[Dict]:
+        blocks = paragraph_blocks(it.get("summary") or "(No caption)")
+        when = " @ ".join(x for x in (it.get("date_hint"), it.get("time_hint")) if x) or "TBD"
+        blocks.append(_bullet("When", when))
+        for label, key in (("Where", "venue_hint"), ("Cost", "price_hint"), ("Contact", "contact_hint"), ("Link", "url_found")):
+            if it.get(key):
+                blocks.append(_bullet(label, str(it[key])))
+        if it.get("url"):
+            blocks.append({"object": "block", "type": "paragraph",
+                           "paragraph": {"rich_text": [_text("Open post", link=it["url"])]}})
+        return blocks
+
+    @staticmethod
+    def content_hash(value) -> str:
+        return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _sync_blocks(self, page_id: str, children: List[Dict], known: List[List] | None) -> List[List]:
+        """
+        Bring the page's blocks in line with `children`, touching only what changed: blocks at the
+        same position and of the same type are updated in place if their content differs, the rest
+        of the old blocks are deleted and the rest of the new ones appended. `known` is the
+        [[block id, type, hash], ...] recorded last time; missing ids (pages created by this
+        sync) are filled in by listing the page's blocks first.
+        Returns the new record.
+        """
+        if known is None or any(bid is None for bid, _, _ in known):
+            listed = self.api.list_children(page_id)
+            hashes = [h for _, _, h in known] if known and len(known) == len(listed) else [None] * len(listed)
+            types = [k for _, k, _ in known] if known and len(known) == len(listed) else [None] * len(listed)
+            known = [[b["id"], b.get("type"), h if k == b.get("type") else None] for b, k, h in zip(listed, types, hashes)]
+        record = []
+        i = 0
+        while i < min(len(known), len(children)) and known[i][1] == children[i]["type"]:
+            bid, kind, old_hash = known[i]
+            new_hash = self.content_hash(children[i])
+            if new_hash != old_hash:
+                self.api.call(self.api.client.blocks.update, block_id=bid, **{kind: children[i][kind]})
+            record.append([bid, kind, new_hash])
+            i += 1
+        for bid, _, _ in known[i:]:
+            self.api.call(self.api.client.blocks.delete, block_id=bid)
+        ids = self.api.append_children(page_id, children[i:])
+        record += [[bid, b["type"], self.content_hash(b)] for bid, b in zip(ids, children[i:])]
+        return record
+
+    def upsert(self, it: Dict) -> str:
+        """Create or update the item's page; returns "created", "updated" or "unchanged"."""
+        from notion_client.errors import APIResponseError
+
+        sc = it["shortcode"]
+        props, children = self.properties(it), self.children(it)
+        props_hash = self.content_hash(props)
+        digest = self.content_hash([props_hash, children])
+        with self._lock:
+            known = self.index.get(sc)
+        if known is not None and known.get("hash") == digest:
+            return "unchanged"
+        entry = {"page_id": None, "hash": digest, "props": props_hash, "blocks": None}
+        if known is not None:
+            try:
+                if known.get("props") != props_hash:
+                    self.api.call(self.api.client.pages.update, page_id=known["page_id"], properties=props)
+                entry["blocks"] = self._sync_blocks(known["page_id"], children, known.get("blocks"))
+                entry["page_id"] = known["page_id"]
+            except APIResponseError as e:
+                if e.status != 404:
+                    raise
+                known = None  # deleted on the Notion side: create it again
+        if known is None:
+            # block ids aren't in the create response; they're listed on the first update
+            entry["page_id"] = self.api.create_page({"database_id": self.database_id}, props, children)
+            entry["blocks"] = [[None, b["type"], self.content_hash(b)] for b in children]
+        with self._lock:
+            self.index[sc] = entry
+        return "updated" if known is not None else "created"
+
+    def sync(self, items: List[Dict]) -> Dict[str, int]:
+        # One upsert per shortcode (the last analyzed copy wins); items without one can't be keyed
+        latest = {it["shortcode"]: it for it in items if it.get("shortcode")}
+        if not latest:
+            return self.stats
+        started = time.perf_counter()
+        self.schema()  # fetched once, before the workers need it
+        if not self.index:
+            self._rebuild_index()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(latest))) as pool:
+            futures = [(sc, pool.submit(self.upsert, it)) for sc, it in latest.items()]
+            for sc, fut in futures:
+                try:
+                    self.stats[fut.result()] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    print(f"[NOTION] ERROR syncing {sc}: {e}")
+        self.save()
+        secs = time.perf_counter() - started
+        print(f"[NOTION] {len(latest)} items in {secs:.2f}s: " + ", ".join(f"{v} {k}" for k, v in self.stats.items())
+              + f" | {self.api.requests} requests, {self.api.retries} retried")
+        return self.stats
+
+    def save(self):
+        if self.index_path:
+            with self._lock:
+                save_json(self.index_path, dict(sorted(self.index.items())))
+
+def sync_to_notion(items: List[Dict]) -> Dict[str, int] | None:
+    """Upsert `items` into NOTION_DATABASE_ID; a no-op unless NOTION_API_KEY and NOTION_DATABASE_ID are set."""
+    if not (NOTION_API_KEY and NOTION_DATABASE_ID):
+        print("[NOTION] Disabled: NOTION_API_KEY / NOTION_DATABASE_ID not set")
+        return None
+    return NotionSync().sync(items)
+
+def push_to_notion(it: Dict):
+    """Single-item form of sync_to_notion()."""
+    return sync_to_notion([it])
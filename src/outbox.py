@@ -0,0 +1,176 @@
+import glob
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from .config import OUTBOX_DIR, SMTP_POOL_SIZE
+
+# A drain keeps retrying due messages for up to OUTBOX_DRAIN_SEC, then leaves the rest for the
+# next run. Backoff between attempts: OUTBOX_BACKOFF_SEC * 2^(attempts-1), capped, with jitter.
+OUTBOX_DRAIN_SEC = float(os.getenv("OUTBOX_DRAIN_SEC", "120"))
+OUTBOX_BACKOFF_SEC = float(os.getenv("OUTBOX_BACKOFF_SEC", "10"))
+OUTBOX_BACKOFF_MAX_SEC = float(os.getenv("OUTBOX_BACKOFF_MAX_SEC", "3600"))
+OUTBOX_MAX_ATTEMPTS = max(1, int(os.getenv("OUTBOX_MAX_ATTEMPTS", "12")))
+
+def _permanent(exc: BaseException) -> bool:
+    """The server rejected this message or recipient for good (5xx); resending won't help.
+    Login and connection problems are not permanent: they're retried like any other failure."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)) and exc.smtp_code >= 500
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class Outbox:
+    """
+    Durable spool of fully rendered messages (OUTBOX_DIR), drained to SMTP with retries.
+    Each message is two files named by its key: <key>.eml (the exact bytes to send) and
+    <key>.json ({"from", "to", "message_id", "queued", "attempts", "next_try", "last_error"}),
+    written in that order, so a .json always has its .eml. A message's key derives from its
+    Message-ID, which hashes the rendered content: queuing an identical message again leaves the
+    spooled one alone rather than adding a second copy, a spooled message is never overwritten
+    by a different one, and a resend after an unconfirmed delivery carries the same Message-ID.
+    Sent messages are deleted; permanently rejected or exhausted ones move to failed/.
+    """
+
+    def __init__(self, path: str = OUTBOX_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self.opened = time.time()  # anything queued before this is an earlier run's leftover
+        self._leftovers_tried = False
+
+    def _files(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.path, f"{key}.eml"), os.path.join(self.path, f"{key}.json")
+
+    @staticmethod
+    def key_for(message_id: str) -> str:
+        return "".join(ch if ch.isalnum() or ch in "-." else "_" for ch in message_id.strip("<>"))
+
+    def put_many(self, messages: Iterable[Tuple[str, str, str, bytes]]) -> int:
+        """Spool (message_id, sender, recipient, data) tuples; returns how many were written.
+        A message whose key is already spooled is skipped: same key, same content."""
+        os.makedirs(self.path, exist_ok=True)
+        now = time.time()
+        n = 0
+        for i, (message_id, sender, recipient, data) in enumerate(messages):
+            eml, meta = self._files(self.key_for(message_id))
+            if os.path.exists(meta):
+                continue
+            _write_atomic(eml, data)
+            entry = {"from": sender, "to": recipient, "message_id": message_id, "queued": now + i * 1e-6,
+                     "attempts": 0, "next_try": 0, "last_error": None}
+            _write_atomic(meta, json.dumps(entry).encode("utf-8"))
+            n += 1
+        return n
+
+    def pending(self) -> List[Dict]:
+        """Spooled messages, oldest first."""
+        out = []
+        for meta in glob.glob(os.path.join(self.path, "*.json")):
+            try:
+                with open(meta, "rb") as f:
+                    entry = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                self._quarantine(meta, e)  # unreadable metadata would otherwise be skipped on every drain
+                continue
+            entry["key"] = os.path.basename(meta)[:-len(".json")]
+            out.append(entry)
+        out.sort(key=lambda e: e["queued"])
+        return out
+
+    def _quarantine(self, meta: str, exc: BaseException):
+        """Move an entry whose metadata can't be read to failed/, next to its .eml if there is one."""
+        failed = os.path.join(self.path, "failed")
+        os.makedirs(failed, exist_ok=True)
+        eml = meta[:-len(".json")] + ".eml"
+        for path in (eml, meta):
+            if os.path.exists(path):
+                os.replace(path, os.path.join(failed, os.path.basename(path)))
+        print(f"[OUTBOX] Moved unreadable entry {os.path.basename(meta)} to failed/: {exc}")
+
+    def __len__(self) -> int:
+        return len(glob.glob(os.path.join(self.path, "*.json")))
+
+    def _done(self, entry: Dict):
+        eml, meta = self._files(entry["key"])
+        os.remove(meta)
+        os.remove(eml)
+
+    def _retry_later(self, entry: Dict, exc: BaseException):
+        entry["attempts"] += 1
+        entry["last_error"] = f"{type(exc).__name__}: {exc}"
+        if _permanent(exc) or entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            failed = os.path.join(self.path, "failed")
+            os.makedirs(failed, exist_ok=True)
+            eml, meta = self._files(entry["key"])
+            os.replace(eml, os.path.join(failed, os.path.basename(eml)))
+            _write_atomic(os.path.join(failed, os.path.basename(meta)), json.dumps(entry).encode("utf-8"))
+            os.remove(meta)
+            print(f"[OUTBOX] Gave up on {entry['to']} after {entry['attempts']} attempt(s): {entry['last_error']}")
+            return
+        delay = min(OUTBOX_BACKOFF_MAX_SEC, OUTBOX_BACKOFF_SEC * 2 ** (entry["attempts"] - 1))
+        entry["next_try"] = time.time() + random.uniform(0.5, 1.0) * delay
+        _write_atomic(self._files(entry["key"])[1], json.dumps({k: v for k, v in entry.items() if k != "key"}).encode("utf-8"))
+
+    def drain(self, max_seconds: float = OUTBOX_DRAIN_SEC) -> Tuple[int, int]:
+        """
+        Send every due message over one SMTPPool, retrying failures with backoff until the
+        outbox is empty or `max_seconds` have passed. Returns (sent, still pending).
+        Earlier runs' leftovers are all tried first, whatever their backoff, and finish before
+        any of this run's messages start. Only one drain per Outbox runs at a time.
+        """
+        from .send_email import SMTPPool
+
+        with self._lock:
+            deadline = time.monotonic() + max_seconds
+            sent = 0
+            started = time.perf_counter()
+            queue = self.pending()
+            if not queue:
+                return 0, 0
+            with SMTPPool(min(SMTP_POOL_SIZE, len(queue))) as pool:
+                def deliver(entry: Dict):
+                    with open(self._files(entry["key"])[0], "rb") as f:
+                        pool.send(entry["from"], entry["to"], f.read())
+
+                with ThreadPoolExecutor(max_workers=pool.size) as ex:
+                    leftovers = [] if self._leftovers_tried else [e for e in queue if e["queued"] < self.opened]
+                    self._leftovers_tried = True
+                    while queue:
+                        now = time.time()
+                        due = leftovers or [e for e in queue if e["next_try"] <= now]
+                        leftovers = []
+                        for entry, fut in [(e, ex.submit(deliver, e)) for e in due]:
+                            try:
+                                fut.result()
+                            except Exception as e:
+                                print(f"[OUTBOX] Send to {entry['to']} failed (attempt {entry['attempts'] + 1}): {e}")
+                                self._retry_later(entry, e)
+                            else:
+                                self._done(entry)
+                                sent += 1
+                        queue = self.pending()
+                        wait = min((e["next_try"] for e in queue), default=now) - time.time()
+                        if not queue or time.monotonic() + max(0.0, wait) > deadline:
+                            break
+                        time.sleep(max(0.0, wait))
+            secs = time.perf_counter() - started
+            print(f"[OUTBOX] Sent {sent} in {secs:.2f}s ({sent / secs if secs else 0:.1f} msg/s); {len(queue)} pending")
+            return sent, len(queue)
+
+    def drain_in_background(self, max_seconds: float = OUTBOX_DRAIN_SEC) -> threading.Thread:
+        """Start drain() on a thread and return it; join() it before the process exits."""
+        t = threading.Thread(target=self.drain, args=(max_seconds,), name="outbox-drain")
+        t.start()
+        return t
@@ -0,0 +1,79 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from .utils import load_json, save_json
+from .config import RETRY_STATE_PATH
+
+# Failure kinds
+RATE_LIMITED = "rate_limited"
+LOGIN_REQUIRED = "login_required"
+NOT_FOUND = "not_found"
+TRANSIENT = "transient"
+RETRYABLE = {RATE_LIMITED, TRANSIENT}
+
+RETRY_ATTEMPTS = max(1, int(os.getenv("RETRY_ATTEMPTS", "3")))
+RETRY_BASE_SEC = float(os.getenv("RETRY_BASE_SEC", "2"))
+RETRY_MAX_SEC = float(os.getenv("RETRY_MAX_SEC", "60"))
+BREAKER_THRESHOLD = max(1, int(os.getenv("BREAKER_THRESHOLD", "3")))
+BREAKER_COOLDOWN_HOURS = float(os.getenv("BREAKER_COOLDOWN_HOURS", "168"))
+
+def classify(exc: BaseException) -> str:
+    from instaloader.exceptions import (  # deferred: replay runs never load instaloader
+        LoginRequiredException,
+        PrivateProfileNotFollowedException,
+        ProfileNotExistsException,
+        QueryReturnedNotFoundException,
+        TooManyRequestsException,
+    )
+    msg = str(exc).lower()
+    if isinstance(exc, TooManyRequestsException) or "429" in msg or "too many requests" in msg:
+        return RATE_LIMITED
+    if isinstance(exc, (LoginRequiredException, PrivateProfileNotFollowedException)) or "login" in msg:
+        return LOGIN_REQUIRED
+    if isinstance(exc, (ProfileNotExistsException, QueryReturnedNotFoundException)):
+        return NOT_FOUND
+    return TRANSIENT
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: attempt 0 -> up to base, 1 -> up to 2*base, ..."""
+    return random.uniform(0, min(RETRY_MAX_SEC, RETRY_BASE_SEC * (2 ** attempt)))
+
+class RetryState:
+    """
+    Per-account failure bookkeeping persisted across runs (src/data/retry_state.json):
+      {username: {"failures": int, "kind": str, "last_failed": iso, "open_until": iso | None}}
+    An entry exists only while an account is failing; it is "pending" and gets fetched first next run.
+    After BREAKER_THRESHOLD consecutive failed runs the breaker opens for BREAKER_COOLDOWN_HOURS,
+    then the account gets a single trial run (half-open) and re-opens if that fails too.
+    """
+
+    def __init__(self, path: str | None = RETRY_STATE_PATH):
+        self.path = path
+        self.accounts: Dict[str, Dict] = load_json(path, default={}) if path else {}
+
+    def is_open(self, username: str, now: datetime) -> bool:
+        until = (self.accounts.get(username) or {}).get("open_until")
+        return bool(until) and datetime.fromisoformat(until) > now
+
+    def order(self, usernames: List[str]) -> List[str]:
+        """Pending retries first, keeping the original order within each group."""
+        return [u for u in usernames if u in self.accounts] + [u for u in usernames if u not in self.accounts]
+
+    def record_success(self, username: str):
+        self.accounts.pop(username, None)
+
+    def record_failure(self, username: str, kind: str, now: datetime):
+        entry = self.accounts.setdefault(username, {"failures": 0})
+        entry["failures"] += 1
+        entry["kind"] = kind
+        entry["last_failed"] = now.isoformat()
+        entry["open_until"] = None
+        if entry["failures"] >= BREAKER_THRESHOLD:
+            entry["open_until"] = (now + timedelta(hours=BREAKER_COOLDOWN_HOURS)).isoformat()
+            print(f"[RETRY] Circuit open for @{username} after {entry['failures']} failed runs ({kind})")
+
+    def save(self):
+        if self.path:
+            save_json(self.path, self.accounts)
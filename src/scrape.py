@@ -1,92 +1,210 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List, Dict, Iterable
+from typing import Dict, Iterator, List
 from itertools import islice
 
-import instaloader
 from .utils import load_json, save_json
-from .config import SEEN_POSTS_PATH, LAST_RUN_PATH, IG_USERNAME, IG_PASSWORD
+from .config import LAST_RUN_PATH
+from .seen_store import SeenStore
+from .sources import make_source
+from .retry import RetryState, RETRY_ATTEMPTS, RETRYABLE, backoff_delay, classify
 
 POST_URL = "https://www.instagram.com/p/{shortcode}/"
 
 MAX_POSTS_PER_ACCOUNT = int(os.getenv("MAX_POSTS_PER_ACCOUNT", "5"))
 LOOKBACK_DAYS = int(os.getenv("LOOKBACK_DAYS", "5"))
+# Seen shortcodes are kept a little past the lookback window, then evicted
+SEEN_TTL_DAYS = float(os.getenv("SEEN_TTL_DAYS", str(LOOKBACK_DAYS + 1)))
 
-def _login_if_needed(L: instaloader.Instaloader):
-    if IG_USERNAME and IG_PASSWORD:
-        try:
-            L.login(IG_USERNAME, IG_PASSWORD)
-        except Exception:
-            pass
+# Concurrent fetching: workers overlap network waits; the source's shared bucket caps the request rate.
+FETCH_WORKERS = max(1, int(os.getenv("FETCH_WORKERS", "4")))
+
+# Per-account watermarks: stop walking a feed once we reach posts we've already processed,
+# after looking at WATERMARK_LATE_POSTS more of them. Those catch posts that show up in the feed
+# late, just below the watermark (posted earlier, visible later); pinned posts never count.
+# Already-seen posts among them are not re-read, so caption edits are not picked up.
+WATERMARK_LATE_POSTS = max(0, int(os.getenv("WATERMARK_LATE_POSTS", "2")))
 
 def read_accounts(file_path: str) -> List[str]:
     with open(file_path, "r", encoding="utf-8") as f:
         return [line.strip().lstrip("@") for line in f if line.strip()]
 
-def _safe_iter_posts(profile) -> Iterable:
+def _parse_utc(s: str | None) -> datetime | None:
     try:
-        for post in profile.get_posts():
-            yield post
-    except Exception:
-        return
+        return datetime.fromisoformat(s) if s else None
+    except ValueError:
+        return None
+
+def _walk_account(source, username: str, seen: SeenStore, cutoff: datetime,
+                  mark_dt: datetime | None, items: Dict[str, Dict]):
+    """One pass over a profile's feed, adding new posts to `items` (by shortcode, so a retried
+    pass doesn't duplicate). Returns (shortcode, date_utc) of the newest post seen. Raises on failure.
+    Tells the source the walk is complete only if it reached the watermark or the cutoff, or ran out
+    of posts, before MAX_POSTS_PER_ACCOUNT: otherwise newer posts may be left for the next run."""
+    newest = None
+    if source.is_quiet(username, cutoff):
+        return newest
+    late_left = WATERMARK_LATE_POSTS
+    walked = 0
+    reached_old = False
+    for post in islice(source.iter_posts(username), MAX_POSTS_PER_ACCOUNT):
+        walked += 1
+        sc = getattr(post, "shortcode", None)
+        taken = getattr(post, "date_utc", datetime(1970, 1, 1))
+        pinned = bool(getattr(post, "is_pinned", False))
+        if sc and (newest is None or taken > newest[1]):
+            newest = (sc, taken)
+        if not pinned and (taken < cutoff or (mark_dt is not None and taken <= mark_dt)):
+            reached_old = True
+
+        if mark_dt is not None and taken <= mark_dt and not pinned:
+            if late_left <= 0:
+                break
+            late_left -= 1
+        if taken < cutoff:
+            if pinned:
+                continue
+            break  # feed is newest-first past the pinned posts
+        if not sc or sc in seen or sc in items:
+            continue
+
+        caption = (post.caption or "").strip()
+        items[sc] = {
+            "account": username,
+            "shortcode": sc,
+            "url": POST_URL.format(shortcode=sc),
+            "taken_at": taken.isoformat(),
+            "caption": caption,
+        }
+    if reached_old or walked < MAX_POSTS_PER_ACCOUNT:
+        source.walk_complete(username)
+    return newest
 
-def fetch_new_posts(accounts_file: str):
+def _fetch_account(source, username: str, seen: SeenStore, cutoff: datetime, mark: Dict | None) -> Dict:
     """
-    Returns (items, meta) where:
-      - items: List[Dict]
-      - meta: {"rate_limited": bool}
+    Fetch one profile's new posts, retrying rate-limit and transient failures with exponential backoff.
+    Runs on a worker thread; never touches shared state. On failure, posts collected before the error
+    are still returned and "error" holds the failure kind.
     """
-    seen = load_json(SEEN_POSTS_PATH, default={})
-    _ = load_json(LAST_RUN_PATH, default={})
-
-    L = instaloader.Instaloader(
-        download_pictures=False,
-        download_videos=False,
-        download_video_thumbnails=False,
-        download_geotags=False,
-        download_comments=False,
-        save_metadata=False,
-        quiet=True,
-    )
-    _login_if_needed(L)
-
-    usernames = read_accounts(accounts_file)
-    new_items: List[Dict] = []
-    cutoff = datetime.utcnow() - timedelta(days=LOOKBACK_DAYS)
-    rate_limited = False
-
-    for username in usernames:
+    started = time.monotonic()
+    items: Dict[str, Dict] = {}
+    newest = None
+    error = None
+    mark_dt = _parse_utc((mark or {}).get("date_utc"))
+    for attempt in range(RETRY_ATTEMPTS):
         try:
-            profile = instaloader.Profile.from_username(L.context, username)
-        except Exception:
-            rate_limited = True
-            continue
+            newest = _walk_account(source, username, seen, cutoff, mark_dt, items)
+            error = None
+            break
+        except Exception as e:
+            error = classify(e)
+            if error not in RETRYABLE or attempt == RETRY_ATTEMPTS - 1:
+                break
+            delay = backoff_delay(attempt)
+            print(f"[SCRAPE] @{username}: {error} ({e}); retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
 
-        for post in islice(_safe_iter_posts(profile), MAX_POSTS_PER_ACCOUNT):
-            try:
-                sc = getattr(post, "shortcode", None)
-                if not sc or sc in seen:
-                    continue
-                if getattr(post, "date_utc", datetime(1970, 1, 1)) < cutoff:
-                    continue
-
-                caption = (post.caption or "").strip()
-                item = {
-                    "account": username,
-                    "shortcode": sc,
-                    "url": POST_URL.format(shortcode=sc),
-                    "taken_at": post.date_utc.isoformat(),
-                    "caption": caption,
-                }
-                new_items.append(item)
-                seen[sc] = True
-            except Exception:
-                rate_limited = True
-                continue
+    watermark = {"shortcode": newest[0], "date_utc": newest[1].isoformat()} if newest and not error else None
+    return {
+        "items": list(items.values()),
+        "ok": error is None,
+        "error": error,
+        "latency": time.monotonic() - started,
+        "watermark": watermark,
+    }
 
-        time.sleep(1)
+def iter_new_posts(accounts_file: str, source=None, meta: Dict | None = None) -> Iterator[Dict]:
+    """
+    Yield new post items as each account finishes (completion order, not accounts.txt order).
+    `meta` is filled in once the generator is exhausted or closed:
+      {"rate_limited": bool, "partial": [username], "skipped": [username], "latency": {username: seconds}}
+    Accounts are fetched by FETCH_WORKERS threads sharing the source's token bucket. Accounts that failed
+    last run go first; accounts whose circuit breaker is open are skipped ("skipped").
+    "partial" lists accounts that still failed after retries; rate_limited is True if any did.
+    `source` defaults to make_source() (POST_SOURCE). A source with persist_state=False (dry runs)
+    starts from the saved state but never writes it back; replay sources start from none.
+    """
+    meta = meta if meta is not None else {}
+    source = source or make_source()
+    persist = source.persist_state
+    if persist:
+        seen = SeenStore()
+        last_run = load_json(LAST_RUN_PATH, default={})
+        retry_state = RetryState()
+    elif source.reads_state:  # dry run: real seen/watermark/breaker decisions, nothing saved
+        seen = SeenStore.snapshot()
+        last_run = load_json(LAST_RUN_PATH, default={})
+        retry_state = RetryState()
+    else:
+        seen = SeenStore(":memory:", legacy_json_path=None)
+        last_run = {}
+        retry_state = RetryState(path=None)
+    watermarks: Dict[str, Dict] = last_run.get("watermarks", {})
+
+    now = source.now()
+    usernames = []
+    skipped = []
+    for username in retry_state.order(source.accounts(read_accounts(accounts_file))):
+        if retry_state.is_open(username, now):
+            skipped.append(username)
+        else:
+            usernames.append(username)
+    if skipped:
+        print(f"[SCRAPE] Circuit open, skipping: {', '.join('@' + u for u in skipped)}")
 
-    save_json(SEEN_POSTS_PATH, seen)
-    save_json(LAST_RUN_PATH, {"timestamp": datetime.utcnow().isoformat()})
-    return new_items, {"rate_limited": rate_limited}
+    cutoff = now - timedelta(days=LOOKBACK_DAYS)
+    partial: List[str] = []
+    latency: Dict[str, float] = {}
+
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, max(1, len(usernames)))) as pool:
+            futures = {
+                pool.submit(_fetch_account, source, u, seen, cutoff, watermarks.get(u)): u
+                for u in usernames
+            }
+            for fut in as_completed(futures):
+                username, res = futures[fut], fut.result()
+                latency[username] = res["latency"]
+                if not res["ok"]:
+                    partial.append(username)
+                    retry_state.record_failure(username, res["error"], now)
+                else:
+                    retry_state.record_success(username)
+                if res["watermark"]:
+                    # Only advance on a clean walk, otherwise posts between the old and new mark could be skipped forever
+                    old = _parse_utc(watermarks.get(username, {}).get("date_utc"))
+                    if old is None or _parse_utc(res["watermark"]["date_utc"]) > old:
+                        watermarks[username] = res["watermark"]
+                fresh = []
+                for item in res["items"]:
+                    if item["shortcode"] in seen:  # same post surfaced by two accounts (collabs)
+                        continue
+                    seen.add(item["shortcode"], item["taken_at"])
+                    fresh.append(item)
+                print(f"[SCRAPE] @{username}: {len(fresh)} new in {res['latency']:.2f}s" + ("" if res["ok"] else f" (failed: {res['error']})"))
+                yield from fresh
+        print(f"[SCRAPE] {len(usernames)} accounts in {time.monotonic() - started:.2f}s with {FETCH_WORKERS} worker(s)")
+    finally:
+        evicted = seen.evict(now - timedelta(days=SEEN_TTL_DAYS))
+        print(f"[SCRAPE] Seen store: {len(seen)} entries ({evicted} evicted)")
+        seen.close()
+        source.close()
+        if persist:
+            save_json(LAST_RUN_PATH, {"timestamp": datetime.utcnow().isoformat(), "watermarks": watermarks})
+            retry_state.save()
+        meta.update({"rate_limited": bool(partial), "partial": partial, "skipped": skipped, "latency": latency})
+
+def fetch_new_posts(accounts_file: str, source=None):
+    """
+    Returns (items, meta) where:
+      - items: List[Dict], in accounts.txt order
+      - meta: see iter_new_posts
+    """
+    meta: Dict = {}
+    new_items = list(iter_new_posts(accounts_file, source=source, meta=meta))
+    order = {u: i for i, u in enumerate(read_accounts(accounts_file))}
+    new_items.sort(key=lambda it: order.get(it["account"], len(order)))  # stable: unknown accounts keep arrival order
+    return new_items, meta
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .utils import load_json
+from .config import SEEN_DB_PATH, SEEN_POSTS_PATH
+
+def _epoch(dt: datetime | str | float | None) -> float:
+    """Naive datetimes are UTC (Instaloader's date_utc)."""
+    if dt is None:
+        return time.time()
+    if isinstance(dt, (int, float)):
+        return float(dt)
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    if dt.tzinfo is None:
+        return (dt - datetime(1970, 1, 1)).total_seconds()
+    return dt.timestamp()
+
+class SeenStore:
+    """
+    Shortcodes we've already delivered, keyed for O(1) lookups and evicted by post age.
+    Backed by one SQLite file: writes are transactional (a crash leaves the last commit intact)
+    and auto_vacuum keeps the file as small as its live rows.
+    Safe to share across the scraper's worker threads.
+    """
+
+    def __init__(self, path: str = SEEN_DB_PATH, legacy_json_path: str | None = SEEN_POSTS_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA auto_vacuum=FULL")  # only takes effect on a fresh file
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " shortcode TEXT PRIMARY KEY,"
+            " taken_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS seen_taken_at ON seen (taken_at)")
+        self._db.commit()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_legacy(legacy_json_path)
+
+    @classmethod
+    def snapshot(cls, path: str = SEEN_DB_PATH, legacy_json_path: str | None = SEEN_POSTS_PATH) -> "SeenStore":
+        """An in-memory copy of the store at `path` (plus a not yet migrated legacy JSON):
+        changes never reach either file."""
+        store = cls(":memory:", legacy_json_path=None)
+        if os.path.exists(path):
+            src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                with store._lock:
+                    src.backup(store._db)
+            finally:
+                src.close()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            store._import_legacy(legacy_json_path, remove=False)
+        return store
+
+    def _import_legacy(self, json_path: str, remove: bool = True):
+        """One-off migration from seen_posts.json (shortcode -> True). Post dates weren't
+        recorded there, so entries age out one TTL after the migration."""
+        legacy = load_json(json_path, default={})
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO seen (shortcode, taken_at) VALUES (?, ?)",
+                ((sc, now) for sc in legacy),
+            )
+        if not remove:
+            return
+        os.remove(json_path)
+        print(f"[SEEN] Migrated {len(legacy)} shortcodes from {os.path.basename(json_path)}")
+
+    def __contains__(self, shortcode: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM seen WHERE shortcode = ?", (shortcode,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def add(self, shortcode: str, taken_at: datetime | str | None = None):
+        """Staged until commit()."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO seen (shortcode, taken_at) VALUES (?, ?)",
+                (shortcode, _epoch(taken_at)),
+            )
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def evict(self, older_than: datetime) -> int:
+        """Drop shortcodes whose post predates `older_than` (they can't pass the lookback filter anyway)."""
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM seen WHERE taken_at < ?", (_epoch(older_than),))
+        return cur.rowcount
+
+    def compact(self):
+        with self._lock:
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    # python -m src.seen_store compact [ttl_days]
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("usage: python -m src.seen_store compact [ttl_days]")
+        sys.exit(2)
+    from .scrape import SEEN_TTL_DAYS
+    ttl = float(sys.argv[2]) if len(sys.argv) > 2 else SEEN_TTL_DAYS
+    with SeenStore() as store:
+        before = os.path.getsize(store.path)
+        dropped = store.evict(datetime.utcnow() - timedelta(days=ttl))
+        store.compact()
+        print(f"[SEEN] Evicted {dropped}, {len(store)} left, {before} -> {os.path.getsize(store.path)} bytes")
@@ -1,16 +1,27 @@
+import hashlib
+import queue
 import smtplib
+import threading
+import uuid
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 from email.header import Header
-from email.utils import formataddr
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import formataddr, formatdate
+from typing import List, Tuple
 
-from .config import GMAIL_ADDRESS, GMAIL_APP_PASSWORD, RECIPIENT_EMAIL
+from .ics import attendee_line
+from .config import (GMAIL_ADDRESS, GMAIL_APP_PASSWORD, RECIPIENT_EMAILS, SMTP_HOST, SMTP_PORT, SMTP_SSL,
+                     SMTP_STARTTLS, SMTP_AUTH, SMTP_POOL_SIZE, SMTP_DEBUG)
 
-def _attach_calendar_invite(msg: MIMEMultipart, fname: str, data: bytes):
+# Build invites with this as the attendee; each recipient's copy gets their own address swapped in
+INVITE_ATTENDEE = "attendee@jarvis.invalid"
+
+def _calendar_part(fname: str, data: bytes) -> MIMEBase:
     """
-    Attach a single inline calendar invite (METHOD:REQUEST).
+    A single inline calendar invite (METHOD:REQUEST).
     Gmail/Apple will render native Add-to-Calendar UI.
     """
     part = MIMEBase('text', 'calendar', name=fname)
@@ -20,60 +31,181 @@ def _attach_calendar_invite(msg: MIMEMultipart, fname: str, data: bytes):
     part.add_header('Content-Disposition', f'inline; filename="{fname}"')
     part.add_header('Content-Transfer-Encoding', '8bit')
     part.add_header('Content-Class', 'urn:content-classes:calendarmessage')
-    msg.attach(part)
+    return part
 
-def _attach_file(msg: MIMEMultipart, fname: str, data: bytes, mime: str):
+def _file_part(fname: str, data: bytes, mime: str) -> MIMEBase:
     maintype, subtype = mime.split('/', 1)
     part = MIMEBase(maintype, subtype, name=fname)
     part.set_payload(data)
     encoders.encode_base64(part)
     part.add_header('Content-Disposition', f'attachment; filename="{fname}"')
     part.add_header('Content-Type', f'{mime}; charset=UTF-8')
-    msg.attach(part)
+    return part
+
+def _digest_part(html_body: str, text_body: str | None) -> MIMEMultipart:
+    """Pretty digest (HTML + optional plaintext)."""
+    alt = MIMEMultipart('alternative')
+    if text_body:
+        alt.attach(MIMEText(text_body, 'plain', 'utf-8'))
+    alt.attach(MIMEText(html_body, 'html', 'utf-8'))
+    return alt
+
+# A multipart/mixed message is assembled from already-serialized parts (CRLF line endings throughout)
+def _head(boundary: str, headers: List[str]) -> bytes:
+    head = headers + ["MIME-Version: 1.0", f'Content-Type: multipart/mixed; boundary="{boundary}"']
+    return ("\r\n".join(head) + "\r\n\r\n").encode("ascii")
+
+def _delimited(boundary: str, part: bytes) -> bytes:
+    return f"--{boundary}\r\n".encode("ascii") + part + b"\r\n"
+
+class SMTPPool:
+    """
+    Up to `size` authenticated connections to SMTP_HOST, opened on first use and reused for
+    every message. A connection the server dropped is reopened once per send.
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.size = size
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+        self._opened = 0
+        self._all: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) if SMTP_SSL else smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+        server.set_debuglevel(1 if SMTP_DEBUG else 0)
+        if SMTP_STARTTLS and not SMTP_SSL:
+            server.starttls()
+        if SMTP_AUTH:
+            server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
+        with self._lock:
+            self._all.append(server)
+        return server
+
+    def _checkout(self) -> smtplib.SMTP:
+        with self._lock:
+            can_open = self._idle.empty() and self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except BaseException:
+            with self._lock:
+                self._opened -= 1  # free the slot, or later checkouts would wait on a connection that never comes
+            raise
 
-def send_email(subject: str, html_body: str, text_body: str = None, attachments=None, invites=None):
+    def send(self, sender: str, recipient: str, data: bytes):
+        server = self._checkout()
+        try:
+            try:
+                server.sendmail(sender, [recipient], data)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                server.close()
+                server = self._connect()
+                server.sendmail(sender, [recipient], data)
+        finally:
+            self._idle.put(server)
+
+    def close(self):
+        for server in self._all:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def email_enabled(recipients: List[str] | None = None) -> bool:
+    recipients = RECIPIENT_EMAILS if recipients is None else recipients
+    return bool(GMAIL_ADDRESS and recipients and (GMAIL_APP_PASSWORD or not SMTP_AUTH))
+
+def content_digest(subject: str, html_body: str, text_body: str | None = None, attachments=None, invites=None) -> str:
+    """Hash of everything a digest renders from; two runs share it only if they'd send the same mail."""
+    h = hashlib.sha1()
+    for chunk in [subject, html_body, text_body or ""]:
+        h.update(chunk.encode("utf-8") + b"\0")
+    for fname, data, *_ in (attachments or []) + (invites or []):
+        h.update(fname.encode("utf-8") + b"\0" + data + b"\0")
+    return h.hexdigest()
+
+def message_id_for(content: str, recipient: str) -> str:
+    """Stable per (content_digest, recipient): a retry of the same digest reuses it, so the mail
+    server and client can recognise a resent copy as a duplicate, while a different digest sent
+    the same day (same subject) gets its own."""
+    digest = hashlib.sha1(f"{content}\0{recipient.lower()}".encode("utf-8")).hexdigest()[:32]
+    return f"<{digest}@jarvis-brief>"
+
+def build_messages(subject: str, html_body: str, text_body: str = None, attachments=None, invites=None,
+                   recipients: List[str] | None = None) -> List[Tuple[str, str, str, bytes]]:
     """
+    One rendered message per recipient (default RECIPIENT_EMAILS), as
+    (message_id, sender, recipient, bytes) ready for the Outbox.
     attachments: list of (filename, bytes, mime)
-    invites: list of (filename, bytes) where bytes is iCalendar (METHOD:REQUEST)
+    invites: list of (filename, bytes) where bytes is iCalendar (METHOD:REQUEST); INVITE_ATTENDEE
+    in them is replaced by each recipient's address.
     """
     attachments = attachments or []
     invites = invites or []
+    recipients = RECIPIENT_EMAILS if recipients is None else recipients
 
-    if not (GMAIL_ADDRESS and GMAIL_APP_PASSWORD and RECIPIENT_EMAIL):
-        print("[EMAIL] Disabled: missing one of GMAIL_ADDRESS / GMAIL_APP_PASSWORD / RECIPIENT_EMAIL")
-        print(f"[EMAIL] GMAIL_ADDRESS set? {bool(GMAIL_ADDRESS)} | APP_PASSWORD set? {bool(GMAIL_APP_PASSWORD)} | RECIPIENT set? {bool(RECIPIENT_EMAIL)}")
-        return
+    if not email_enabled(recipients):
+        print("[EMAIL] Disabled: missing one of GMAIL_ADDRESS / GMAIL_APP_PASSWORD / RECIPIENT_EMAIL(S)")
+        print(f"[EMAIL] GMAIL_ADDRESS set? {bool(GMAIL_ADDRESS)} | APP_PASSWORD set? {bool(GMAIL_APP_PASSWORD)} | recipients: {len(recipients)}")
+        return []
 
-    print(f"[EMAIL] Preparing message to {RECIPIENT_EMAIL} with subject: {subject}")
+    print(f"[EMAIL] Preparing {len(recipients)} message(s) with subject: {subject}")
 
-    # Root container
-    msg = MIMEMultipart('mixed')
-    # UTF-8 headers (important if subject has ‘—’, accents, etc.)
-    msg['From'] = formataddr((str(Header("", 'utf-8')), GMAIL_ADDRESS))
-    msg['To'] = formataddr((str(Header("", 'utf-8')), RECIPIENT_EMAIL))
-    msg['Subject'] = str(Header(subject, 'utf-8'))
+    # Everything but the To/Message-ID headers and the invites' ATTENDEE is the same for every
+    # recipient: serialize it once. UTF-8 headers (important if subject has ‘—’, accents, etc.)
+    boundary = f"==jarvis-{uuid.uuid4().hex}=="
+    content = content_digest(subject, html_body, text_body, attachments, invites)
+    from_header = "From: " + formataddr((str(Header("", 'utf-8')), GMAIL_ADDRESS))
+    subject_header = "Subject: " + Header(subject, 'utf-8').encode(linesep="\r\n")
+    date_header = "Date: " + formatdate(localtime=True)
+    digest = _delimited(boundary, _digest_part(html_body, text_body).as_bytes(policy=SMTP_POLICY))
+    # Inline calendar invites: 8bit parts, so the attendee can be swapped in the serialized bytes
+    invite_parts = b"".join(_delimited(boundary, _calendar_part(fname, data).as_bytes(policy=SMTP_POLICY))
+                            for (fname, data) in invites)
+    # Optional attachments (e.g., combined .ics)
+    tail = b"".join(_delimited(boundary, _file_part(fname, data, mime).as_bytes(policy=SMTP_POLICY))
+                    for (fname, data, mime) in attachments) + f"--{boundary}--\r\n".encode("ascii")
+    # The whole (folded) ATTENDEE line is swapped, so a long address is folded properly too
+    placeholder = attendee_line(INVITE_ATTENDEE).encode("ascii")
 
-    # Pretty digest (HTML + optional plaintext)
-    alt = MIMEMultipart('alternative')
-    if text_body:
-        alt.attach(MIMEText(text_body, 'plain', 'utf-8'))
-    alt.attach(MIMEText(html_body, 'html', 'utf-8'))
-    msg.attach(alt)
+    messages = []
+    for rcpt in recipients:
+        message_id = message_id_for(content, rcpt)
+        headers = [from_header, "To: " + formataddr((str(Header("", 'utf-8')), rcpt)), subject_header,
+                   date_header, f"Message-ID: {message_id}"]
+        # Bytes throughout, to avoid any implicit ASCII encoding
+        data = b"".join([_head(boundary, headers), digest, invite_parts.replace(placeholder, attendee_line(rcpt).encode("utf-8")), tail])
+        messages.append((message_id, GMAIL_ADDRESS, rcpt, data))
+    return messages
 
-    # Inline calendar invites
-    for (fname, data) in invites:
-        _attach_calendar_invite(msg, fname, data)
+def queue_email(subject: str, html_body: str, text_body: str = None, attachments=None, invites=None,
+                recipients: List[str] | None = None, outbox=None) -> int:
+    """Render the messages (build_messages) into the outbox without sending; returns how many were queued."""
+    from .outbox import Outbox
 
-    # Optional attachments (e.g., combined .ics)
-    for (fname, data, mime) in attachments:
-        _attach_file(msg, fname, data, mime)
+    outbox = outbox or Outbox()
+    queued = outbox.put_many(build_messages(subject, html_body, text_body, attachments, invites, recipients))
+    if queued:
+        print(f"[EMAIL] Queued {queued} message(s) in the outbox")
+    return queued
 
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.set_debuglevel(1)
-            server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-            # Send as bytes to avoid any implicit ASCII encoding
-            server.sendmail(GMAIL_ADDRESS, [RECIPIENT_EMAIL], msg.as_bytes())
-        print("[EMAIL] Sent successfully.")
-    except Exception as e:
-        print(f"[EMAIL] ERROR sending email: {e}")
+def send_email(subject: str, html_body: str, text_body: str = None, attachments=None, invites=None,
+               recipients: List[str] | None = None) -> int:
+    """queue_email(), then drain the outbox in the foreground (older unsent messages go first).
+    Returns the number of messages sent; failures stay queued for the next drain."""
+    from .outbox import Outbox
+
+    outbox = Outbox()
+    if not queue_email(subject, html_body, text_body, attachments, invites, recipients, outbox=outbox) and not len(outbox):
+        return 0
+    return outbox.drain()[0]
@@ -0,0 +1,58 @@
+import os
+import time
+
+from .config import IG_USERNAME, IG_PASSWORD, IG_SESSION_PATH, IG_SESSION_MAX_AGE_HOURS
+
+def _session_age_hours(path: str) -> float:
+    return (time.time() - os.path.getmtime(path)) / 3600.0
+
+def _restore_session(L, username: str, persist: bool = True) -> bool:
+    """Load the cached session. Recently saved sessions are trusted as-is (no request);
+    older ones are validated with a single test_login() call."""
+    if not os.path.exists(IG_SESSION_PATH):
+        return False
+    try:
+        L.load_session_from_file(username, IG_SESSION_PATH)
+    except Exception:
+        return False
+    if _session_age_hours(IG_SESSION_PATH) < IG_SESSION_MAX_AGE_HOURS:
+        return True
+    try:
+        if L.test_login() == username:
+            if persist:
+                os.utime(IG_SESSION_PATH)  # validated: trust it for another window
+            return True
+    except Exception:
+        pass
+    return False
+
+def ensure_login(L, username: str | None = IG_USERNAME, password: str | None = IG_PASSWORD,
+                 persist: bool = True) -> str:
+    """
+    Log `L` in, reusing the cached session when possible. persist=False (dry runs) never
+    writes the session file, not even to refresh its age.
+    Returns how auth was obtained: "session", "login", "failed" or "anonymous".
+    """
+    if not (username and password):
+        return "anonymous"
+
+    started = time.monotonic()
+    if _restore_session(L, username, persist):
+        print(f"[AUTH] Reused cached session for {username} in {time.monotonic() - started:.2f}s")
+        return "session"
+
+    try:
+        L.login(username, password)
+    except Exception as e:
+        print(f"[AUTH] Login failed; continuing without login: {e}")
+        return "failed"
+    if not persist:
+        print(f"[AUTH] Full login for {username} in {time.monotonic() - started:.2f}s (session not saved)")
+        return "login"
+    try:
+        os.makedirs(os.path.dirname(IG_SESSION_PATH), exist_ok=True)
+        L.save_session_to_file(IG_SESSION_PATH)
+    except Exception as e:
+        print(f"[AUTH] Could not save session: {e}")
+    print(f"[AUTH] Full login for {username} in {time.monotonic() - started:.2f}s")
+    return "login"
@@ -0,0 +1,286 @@
+import gzip
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from .utils import load_json, save_json
+from .config import CACHE_DIR, PROFILE_CACHE_PATH
+from .ratelimit import TokenBucket
+from .session import ensure_login
+
+# Where posts come from: "live" (Instagram), "record" (live + write a corpus), "replay" (read a corpus)
+POST_SOURCE = os.getenv("POST_SOURCE", "live")
+POST_SOURCE_PATH = os.getenv("POST_SOURCE_PATH") or os.path.join(CACHE_DIR, "corpus.jsonl.gz")
+
+IG_REQUESTS_PER_SEC = float(os.getenv("IG_REQUESTS_PER_SEC", "1.0"))
+IG_REQUEST_BURST = int(os.getenv("IG_REQUEST_BURST", "2"))
+
+# Profile metadata cache: an account checked within the TTL whose newest post predates the
+# lookback window is skipped without any request. Keep the TTL below LOOKBACK_DAYS so a post
+# made while an account was being skipped still falls inside the window on the next check.
+PROFILE_CACHE_TTL_HOURS = float(os.getenv("PROFILE_CACHE_TTL_HOURS", "60"))
+
+# The only post fields the pipeline reads; also the shape of a recorded corpus line
+PostRecord = namedtuple("PostRecord", ["account", "shortcode", "date_utc", "caption", "is_pinned"])
+
+def _bucket_rate_controller(instaloader):
+    """RateController subclass, built on first use so importing this module doesn't load instaloader."""
+
+    class _BucketRateController(instaloader.RateController):
+        """Instaloader's own sliding-window limits, plus one token per request from the shared bucket.
+        One per Instaloader context, so only that context's thread ever touches it."""
+
+        def __init__(self, context, bucket: TokenBucket):
+            super().__init__(context)
+            self._bucket = bucket
+            self.requests = 0
+
+        def wait_before_query(self, query_type: str) -> None:
+            self._bucket.acquire()
+            self.requests += 1
+            super().wait_before_query(query_type)
+
+    return _BucketRateController
+
+class LiveSource:
+    """
+    Instagram via Instaloader. Every request takes a token from one shared bucket.
+    Instaloader isn't thread-safe, so each fetch worker thread gets its own Instaloader
+    (context, requests session and rate controller), all carrying the one logged-in session.
+    Keeps a profile cache (.cache/profiles.json) of username -> userid, mediacount,
+    newest post date and when we last checked, so quiet accounts can be skipped or
+    short-circuited and renamed handles still resolve by id.
+    With persist_state=False (dry runs) the profile cache and login session are read but never
+    saved, and the pipeline reads seen/watermark/retry state without writing it back.
+    """
+    reads_state = True
+
+    def __init__(self, persist_state: bool = True):
+        self.persist_state = persist_state
+        self._bucket = TokenBucket(IG_REQUESTS_PER_SEC, IG_REQUEST_BURST)
+        self._controllers: List = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.L = self._new_loader()
+        ensure_login(self.L, persist=persist_state)
+        # Cookies the worker loaders start from (None: not logged in, they stay anonymous)
+        self._session = (self.L.context.username, self.L.save_session()) if self.L.context.is_logged_in else None
+        self._local.L = self.L
+        self._profiles: Dict[str, Dict] = load_json(PROFILE_CACHE_PATH, default={})
+        self._counts: Dict[str, int] = {}  # mediacount seen by iter_posts, cached once walk_complete() confirms it
+
+    def _new_loader(self):
+        import instaloader  # deferred: replay runs and plain imports never load it
+
+        controller_cls = _bucket_rate_controller(instaloader)
+
+        def _controller(ctx):
+            rc = controller_cls(ctx, self._bucket)
+            with self._lock:
+                self._controllers.append(rc)
+            return rc
+
+        return instaloader.Instaloader(
+            download_pictures=False,
+            download_videos=False,
+            download_video_thumbnails=False,
+            download_geotags=False,
+            download_comments=False,
+            save_metadata=False,
+            quiet=True,
+            rate_controller=_controller,
+        )
+
+    def _loader(self):
+        """This thread's Instaloader, created (with the shared session loaded) on first use."""
+        L = getattr(self._local, "L", None)
+        if L is None:
+            L = self._local.L = self._new_loader()
+            if self._session:
+                L.load_session(*self._session)
+        return L
+
+    def accounts(self, default: List[str]) -> List[str]:
+        return default
+
+    def now(self) -> datetime:
+        return datetime.utcnow()
+
+    def is_quiet(self, username: str, cutoff: datetime) -> bool:
+        """True if we checked the account within the TTL and its newest post was already older than `cutoff`."""
+        with self._lock:
+            entry = self._profiles.get(username) or {}
+        checked, last_post = entry.get("checked_at"), entry.get("last_post_utc")
+        if not (checked and last_post):
+            return False
+        fresh = datetime.fromisoformat(checked) > self.now() - timedelta(hours=PROFILE_CACHE_TTL_HOURS)
+        return fresh and datetime.fromisoformat(last_post) < cutoff
+
+    def _resolve(self, username: str, entry: Dict):
+        """
+        from_username is one request and returns the mediacount too, so it's always tried first;
+        from_id costs a request of its own plus that metadata fetch, so the cached id is only
+        the fallback for a handle that was renamed.
+        """
+        import instaloader
+
+        try:
+            return instaloader.Profile.from_username(self._loader().context, username)
+        except instaloader.exceptions.ProfileNotExistsException:
+            if not entry.get("userid"):
+                raise
+            profile = instaloader.Profile.from_id(self._loader().context, entry["userid"])  # handle was renamed
+            print(f"[SCRAPE] @{username} resolved by id to @{profile.username}")
+            return profile
+
+    def iter_posts(self, username: str, skip_unchanged: bool = True) -> Iterable:
+        """
+        Newest-first posts (Instaloader Post objects). Raises like Instaloader does.
+        With skip_unchanged, an account whose post count matches the cache yields nothing:
+        right for callers that only want posts they haven't processed yet. Those callers call
+        walk_complete() once they've processed every new post; only then is the count cached,
+        so a walk cut short (or one that reported without processing) never hides posts.
+        """
+        with self._lock:
+            entry = dict(self._profiles.get(username) or {})
+        profile = self._resolve(username, entry)
+        unchanged = skip_unchanged and entry.get("mediacount") == profile.mediacount and entry.get("last_post_utc")
+        entry.update({
+            "userid": profile.userid,
+            "checked_at": self.now().isoformat(),
+        })
+        with self._lock:
+            self._profiles[username] = entry
+            if skip_unchanged:
+                self._counts[username] = profile.mediacount
+        if unchanged:
+            return iter(())  # same post count as last time: nothing new to page through
+        return self._track_newest(username, profile.get_posts())
+
+    def _track_newest(self, username: str, posts: Iterable) -> Iterable:
+        try:
+            for post in posts:
+                if not getattr(post, "is_pinned", False):
+                    with self._lock:
+                        entry = self._profiles.setdefault(username, {})
+                        last = entry.get("last_post_utc")
+                        if last is None or post.date_utc > datetime.fromisoformat(last):
+                            entry["last_post_utc"] = post.date_utc.isoformat()
+                yield post
+        except Exception:
+            with self._lock:  # walk failed part-way: don't let the cached count hide the rest next time
+                self._profiles.setdefault(username, {})["mediacount"] = None
+                self._counts.pop(username, None)
+            raise
+
+    def walk_complete(self, username: str):
+        """Every post newer than what was already processed has been handled: cache the count iter_posts saw."""
+        with self._lock:
+            if username in self._counts:
+                self._profiles.setdefault(username, {})["mediacount"] = self._counts.pop(username)
+
+    def close(self):
+        if self.persist_state:
+            with self._lock:
+                save_json(PROFILE_CACHE_PATH, self._profiles)
+        print(f"[SCRAPE] Instagram requests this run: {sum(rc.requests for rc in self._controllers)}")
+
+class RecordingSource:
+    """Wraps another source and appends every post it yields to a gzip'd JSONL corpus."""
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.persist_state = inner.persist_state
+        self.reads_state = inner.reads_state
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._out = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def accounts(self, default: List[str]) -> List[str]:
+        return self.inner.accounts(default)
+
+    def now(self) -> datetime:
+        return self.inner.now()
+
+    def is_quiet(self, username: str, cutoff: datetime) -> bool:
+        return self.inner.is_quiet(username, cutoff)
+
+    def walk_complete(self, username: str):
+        self.inner.walk_complete(username)
+
+    def iter_posts(self, username: str, **kwargs) -> Iterable:
+        for post in self.inner.iter_posts(username, **kwargs):
+            rec = {
+                "account": username,
+                "shortcode": post.shortcode,
+                "date_utc": post.date_utc.isoformat(),
+                "caption": post.caption or "",
+                "is_pinned": bool(getattr(post, "is_pinned", False)),
+            }
+            with self._lock:
+                self._out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            yield post
+
+    def close(self):
+        self._out.close()
+        self.inner.close()
+
+class ReplaySource:
+    """
+    Feeds a recorded corpus back without touching the network. The account list and the
+    clock come from the corpus (now = newest post), so old recordings still pass the lookback
+    filter. Runs neither read nor write seen/watermark/retry state.
+    """
+    persist_state = False
+    reads_state = False
+
+    def __init__(self, path: str):
+        self._posts: Dict[str, List[PostRecord]] = {}
+        newest = None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                d = json.loads(line)
+                rec = PostRecord(
+                    account=d["account"],
+                    shortcode=d["shortcode"],
+                    date_utc=datetime.fromisoformat(d["date_utc"]),
+                    caption=d.get("caption", ""),
+                    is_pinned=bool(d.get("is_pinned", False)),
+                )
+                self._posts.setdefault(rec.account, []).append(rec)
+                if newest is None or rec.date_utc > newest:
+                    newest = rec.date_utc
+        for posts in self._posts.values():
+            posts.sort(key=lambda p: (p.is_pinned, p.date_utc), reverse=True)  # pinned first, then newest, like Instagram
+        self._now = newest or datetime.utcnow()
+
+    def accounts(self, default: List[str]) -> List[str]:
+        return list(self._posts)
+
+    def now(self) -> datetime:
+        return self._now
+
+    def is_quiet(self, username: str, cutoff: datetime) -> bool:
+        return False
+
+    def iter_posts(self, username: str, **kwargs) -> Iterable:
+        return iter(self._posts.get(username, []))
+
+    def walk_complete(self, username: str):
+        pass
+
+    def close(self):
+        pass
+
+def make_source(mode: str = POST_SOURCE, path: str = POST_SOURCE_PATH, persist_state: bool = True):
+    """persist_state=False: a live source whose run leaves no state behind (replays never write any)."""
+    if mode == "replay":
+        return ReplaySource(path)
+    if mode == "record":
+        return RecordingSource(LiveSource(persist_state), path)
+    return LiveSource(persist_state)
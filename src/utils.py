@@ -1,10 +1,7 @@
-import json, os, re
+import hashlib, json, os, re
 from datetime import datetime, timedelta
 from pytz import timezone
-from dateparser.search import search_dates
-from .config import SEEN_POSTS_PATH, LAST_RUN_PATH, TZ
-
-os.makedirs(os.path.dirname(SEEN_POSTS_PATH), exist_ok=True)
+from .config import TZ, DATE_MEMO_PATH
 
 EMOJI_RE = re.compile(
     "["
@@ -24,6 +21,7 @@ def load_json(path, default):
     return default
 
 def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
@@ -50,10 +48,15 @@ def _to_naive(dt):
         pass
     return dt
 
+# dateparser call counter, read by bench.py
+DATEPARSER_STATS = {"calls": 0}
+
 def find_dates(text: str, base=None):
     """Return list of (text, naive_dt)."""
     if not text:
         return []
+    DATEPARSER_STATS["calls"] += 1
+    from dateparser.search import search_dates  # ~0.4s of locale data; only paid once a caption needs it
     try:
         hits = search_dates(
             text,
@@ -67,6 +70,59 @@ def find_dates(text: str, base=None):
     except Exception:
         return []
 
+# Persistent memo for find_dates, keyed by normalized text + the local date it was parsed on
+# (relative phrases like "tomorrow" resolve against today). Only today's entries are kept.
+_date_memo = None
+_date_memo_dirty = False
+_date_memo_new = {}  # entries added since the last take_date_memo_updates() (process-pool workers)
+
+def _memo_key(text: str, ref_date: str) -> str:
+    digest = hashlib.sha1(squeeze_ws(text).encode("utf-8")).hexdigest()
+    return f"{ref_date}:{digest}"
+
+def find_dates_cached(text: str):
+    """find_dates() through the on-disk memo; same return shape."""
+    global _date_memo, _date_memo_dirty
+    if not text:
+        return []
+    if _date_memo is None:
+        _date_memo = load_json(DATE_MEMO_PATH, default={})
+    key = _memo_key(text, datetime.now().date().isoformat())
+    hit = _date_memo.get(key)
+    if hit is not None:
+        return [(frag, datetime.fromisoformat(iso)) for frag, iso in hit]
+    hits = find_dates(text)
+    _date_memo[key] = _date_memo_new[key] = [(frag, dt.isoformat()) for frag, dt in hits]
+    _date_memo_dirty = True
+    return hits
+
+def take_date_memo_updates() -> dict:
+    """Memo entries added in this process since the last call (a worker ships these to the parent)."""
+    global _date_memo_new
+    new, _date_memo_new = _date_memo_new, {}
+    return new
+
+def merge_date_memo(entries: dict):
+    """Fold a worker's new memo entries into this process's memo, to be written by save_date_memo()."""
+    global _date_memo, _date_memo_dirty
+    if not entries:
+        return
+    if _date_memo is None:
+        _date_memo = load_json(DATE_MEMO_PATH, default={})
+    _date_memo.update(entries)
+    _date_memo_dirty = True
+
+def save_date_memo():
+    """Write the memo back, dropping entries parsed on earlier days."""
+    global _date_memo_dirty
+    if _date_memo is None or not _date_memo_dirty:
+        return
+    today = datetime.now().date().isoformat()
+    for key in [k for k in _date_memo if not k.startswith(today + ":")]:
+        del _date_memo[key]
+    save_json(DATE_MEMO_PATH, _date_memo)
+    _date_memo_dirty = False
+
 def nearest_future(dts):
     """Pick the nearest future naive datetime from list of (frag, dt)."""
     now = datetime.now()  # naive